@@ -5,6 +5,14 @@ from mixer.backend.django import mixer as _mixer
 from posts.models import Post, Group
 
 
+@pytest.fixture(autouse=True)
+def temp_media_root(settings):
+    """Keep uploaded images and thumbnails out of the project MEDIA_ROOT."""
+    with tempfile.TemporaryDirectory() as temp_directory:
+        settings.MEDIA_ROOT = temp_directory
+        yield temp_directory
+
+
 @pytest.fixture()
 def mock_media(settings):
     with tempfile.TemporaryDirectory() as temp_directory:
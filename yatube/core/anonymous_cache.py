@@ -0,0 +1,132 @@
+"""Кеш целых страниц для анонимных посетителей.
+
+Представление включает кеширование своей страницы, пометив запрос
+тегами — строками вида 'post:1', 'group:2', от которых зависит её
+содержимое (см. core.page_cache.tag_page). Запись кеша хранит версии
+своих тегов; purge выдаёт тегам новые версии, и при следующем запросе
+перестраиваются только страницы с этими тегами, а не весь кеш.
+
+Ключ записи — путь и параметры из ANONYMOUS_PAGE_CACHE_PARAMS (номер
+страницы, курсор), остальные параметры не создают новых записей.
+Запросы с cookie сессии идут мимо кеша, ответы с cookie (сессия, CSRF)
+не сохраняются: в них есть данные конкретного посетителя.
+
+Версии тегов читаются после отрисовки, поэтому изменение, сделанное во
+время отрисовки, может оставить устаревшую страницу; такая страница
+живёт не дольше ANONYMOUS_PAGE_CACHE_TIMEOUT.
+"""
+import hashlib
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+from django.urls import resolve
+from django.utils.cache import get_conditional_response
+from django.utils.http import parse_http_date_safe, urlencode
+
+from core.page_cache import record
+from core.replicas import cap_timeout
+from core.surrogate import purge_later
+
+KEY_PREFIX = 'anonymous_page'
+
+
+def tag_key(tag):
+    return f'anonymous:tag:{tag}'
+
+
+def purge(*tags):
+    """Делает недействительными страницы с любым из тегов, в том числе
+    во внешнем прокси."""
+    cache.set_many({tag_key(tag): uuid.uuid4().hex for tag in tags}, None)
+    purge_later(tags)
+
+
+def get_versions(tags):
+    """Версии тегов по тегу; отсутствующие версии создаются."""
+    cached = cache.get_many([tag_key(tag) for tag in tags])
+    versions = {}
+    for tag in tags:
+        key = tag_key(tag)
+        if key not in cached:
+            cache.add(key, uuid.uuid4().hex, None)
+            cached[key] = cache.get(key)
+        versions[tag] = cached[key]
+    return versions
+
+
+def anonymous_page_key(request):
+    params = [
+        (name, request.GET[name])
+        for name in settings.ANONYMOUS_PAGE_CACHE_PARAMS
+        if name in request.GET
+    ]
+    url = f'{request.path_info}?{urlencode(params)}'
+    return f'{KEY_PREFIX}:{hashlib.md5(url.encode()).hexdigest()}'
+
+
+def is_anonymous(request):
+    return (request.method in ('GET', 'HEAD')
+            and settings.SESSION_COOKIE_NAME not in request.COOKIES)
+
+
+def is_cacheable(request, response):
+    return (
+        request.method == 'GET'
+        and getattr(request, 'page_tags', None)
+        and response.status_code == 200
+        and not response.streaming
+        and not response.cookies
+        and not request.META.get('CSRF_COOKIE_USED')
+        and not settings.DEBUG
+    )
+
+
+class AnonymousPageCacheMiddleware:
+    """Отдаёт анонимным посетителям страницы из кеша.
+
+    Стоит до SessionMiddleware: попадание не загружает ни сессию, ни
+    пользователя. В режиме отладки страницы не сохраняются, чтобы в кеш
+    не попала панель debug_toolbar.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not is_anonymous(request):
+            return self.get_response(request)
+        key = anonymous_page_key(request)
+        response = self.get_cached(request, key)
+        if response is not None:
+            # Представление не вызывалось, но метрики учитывают попадание
+            # под его именем
+            request.resolver_match = resolve(request.path_info)
+            record(request, KEY_PREFIX, 'hits')
+            return response
+        response = self.get_response(request)
+        if is_cacheable(request, response):
+            record(request, KEY_PREFIX, 'misses')
+            store(key, response, request.page_tags)
+        return response
+
+    def get_cached(self, request, key):
+        entry = cache.get(key)
+        if entry is None:
+            return None
+        versions, response = entry
+        if get_versions(versions) != versions:
+            return None
+        return get_conditional_response(
+            request,
+            etag=response.get('ETag'),
+            last_modified=parse_http_date_safe(
+                response.get('Last-Modified')),
+            response=response,
+        )
+
+
+def store(key, response, tags):
+    # Страница из реплики может отставать от версий своих тегов
+    timeout = cap_timeout(settings.ANONYMOUS_PAGE_CACHE_TIMEOUT)
+    cache.set(key, (get_versions(tags), response), timeout)
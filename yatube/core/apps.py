@@ -3,3 +3,7 @@ from django.apps import AppConfig
 
 class CoreConfig(AppConfig):
     name = 'core'
+
+    def ready(self):
+        from . import object_cache, sqlite, template_cache  # noqa: F401
+        object_cache.connect_signals()
@@ -0,0 +1,88 @@
+import inspect
+import threading
+import time
+
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import RequestFactory
+from django.views.decorators.cache import cache_page
+
+from core.page_cache import cache_page_versioned
+from posts.views import index
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает число перестроений главной страницы при истечении '
+        'кеша для cache_page и cache_page_versioned: все потоки '
+        'одновременно запрашивают страницу сразу после истечения TTL.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=16)
+        parser.add_argument('--rounds', type=int, default=5)
+        parser.add_argument('--timeout', type=int, default=1,
+                            help='TTL страницы в секундах.')
+        parser.add_argument(
+            '--render-delay', type=float, default=0.2,
+            help='Дополнительная задержка построения страницы в секундах.',
+        )
+
+    def handle(self, threads, rounds, timeout, render_delay, **options):
+        decorators = {
+            'cache_page': cache_page(timeout, key_prefix='bench_plain'),
+            'cache_page_versioned': cache_page_versioned(
+                timeout, key_prefix='bench_versioned'),
+        }
+        for name, decorator in decorators.items():
+            cache.clear()
+            rebuilds = self.run(decorator, threads, rounds, timeout,
+                                render_delay)
+            self.stdout.write(
+                f'{name:>22}: {rebuilds} перестроений за {rounds} '
+                f'истечений ({rebuilds / rounds:.1f} на истечение, '
+                f'{threads} потоков)'
+            )
+
+    def run(self, decorator, threads, rounds, timeout, render_delay):
+        calls = []
+        calls_lock = threading.Lock()
+
+        def slow_index(request):
+            with calls_lock:
+                calls.append(1)
+            time.sleep(render_delay)
+            return inspect.unwrap(index)(request)
+
+        view = decorator(slow_index)
+        factory = RequestFactory()
+
+        def get():
+            request = factory.get('/')
+            request.user = AnonymousUser()
+            return view(request)
+
+        get()
+        rebuilds = 0
+        for _ in range(rounds):
+            time.sleep(timeout + 0.1)
+            barrier = threading.Barrier(threads)
+            calls.clear()
+
+            def client():
+                try:
+                    barrier.wait()
+                    get()
+                finally:
+                    connection.close()
+
+            workers = [threading.Thread(target=client)
+                       for _ in range(threads)]
+            for worker in workers:
+                worker.start()
+            for worker in workers:
+                worker.join()
+            rebuilds += len(calls)
+        return rebuilds
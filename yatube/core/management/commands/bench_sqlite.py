@@ -0,0 +1,148 @@
+import multiprocessing
+import os
+import random
+import sqlite3
+import statistics
+import tempfile
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from core.sqlite import apply_pragmas
+
+SCHEMA = (
+    'CREATE TABLE post (id INTEGER PRIMARY KEY, author_id INTEGER, '
+    'text TEXT, created REAL)',
+    'CREATE INDEX post_author_created ON post (author_id, created DESC)',
+    'CREATE TABLE counter (name TEXT PRIMARY KEY, value INTEGER)',
+)
+READ_QUERY = (
+    'SELECT id, text, created FROM post WHERE author_id = ? '
+    'ORDER BY created DESC LIMIT 10'
+)
+WRITE_QUERIES = (
+    'INSERT INTO post (author_id, text, created) VALUES (?, ?, ?)',
+    'UPDATE counter SET value = value + 1 WHERE name = ?',
+)
+AUTHORS = 100
+
+
+def run_worker(path, pragmas, role, start, duration, results):
+    """Процесс-читатель или процесс-писатель: выполняет запросы, пока
+    не выйдет время, и отправляет число операций, ошибок и задержки."""
+    # Таймаут блокировки по умолчанию тот же, что у соединений Django
+    connection = sqlite3.connect(path)
+    apply_pragmas(connection, pragmas)
+    operations = errors = 0
+    latencies = []
+    start.wait()
+    deadline = time.monotonic() + duration
+    while time.monotonic() < deadline:
+        author_id = random.randrange(AUTHORS)
+        began = time.perf_counter()
+        try:
+            if role == 'write':
+                with connection:
+                    connection.execute(
+                        WRITE_QUERIES[0], (author_id, 'Пост', time.time()))
+                    connection.execute(WRITE_QUERIES[1], ('posts',))
+            else:
+                connection.execute(READ_QUERY, (author_id,)).fetchall()
+        except sqlite3.OperationalError:
+            errors += 1
+        else:
+            operations += 1
+        latencies.append((time.perf_counter() - began) * 1000)
+    connection.close()
+    results.put((role, operations, errors, latencies))
+
+
+class Command(BaseCommand):
+    help = (
+        'Нагружает базу SQLite процессами-читателями и процессами-'
+        'писателями и сравнивает пропускную способность с PRAGMA по '
+        'умолчанию и с SQLITE_PRODUCTION_PRAGMAS. Каждый профиль работает '
+        'со своим временным файлом базы.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--readers', type=int, default=4)
+        parser.add_argument('--writers', type=int, default=4)
+        parser.add_argument('--duration', type=float, default=5,
+                            help='Длительность замера в секундах.')
+        parser.add_argument('--posts', type=int, default=10_000,
+                            help='Сколько постов в базе до замера.')
+
+    def handle(self, readers, writers, duration, posts, **options):
+        profiles = {
+            'default': {},
+            'production': settings.SQLITE_PRODUCTION_PRAGMAS,
+        }
+        self.stdout.write(
+            f'{"profile":>15} {"reads/s":>9} {"writes/s":>9} '
+            f'{"errors":>7} {"read p99, ms":>13} {"write p99, ms":>14}'
+        )
+        for name, pragmas in profiles.items():
+            with tempfile.TemporaryDirectory() as directory:
+                path = os.path.join(directory, 'bench.sqlite3')
+                self.create_database(path, pragmas, posts)
+                stats = self.run(path, pragmas, readers, writers, duration)
+            self.stdout.write(
+                f'{name:>15} {stats["read"]["rate"]:>9.0f} '
+                f'{stats["write"]["rate"]:>9.0f} '
+                f'{stats["read"]["errors"] + stats["write"]["errors"]:>7} '
+                f'{stats["read"]["p99"]:>13.1f} '
+                f'{stats["write"]["p99"]:>14.1f}'
+            )
+
+    @staticmethod
+    def create_database(path, pragmas, posts):
+        connection = sqlite3.connect(path)
+        apply_pragmas(connection, pragmas)
+        with connection:
+            for statement in SCHEMA:
+                connection.execute(statement)
+            connection.executemany(
+                WRITE_QUERIES[0],
+                ((number % AUTHORS, 'Пост', number) for number in range(posts))
+            )
+            connection.execute(
+                'INSERT INTO counter (name, value) VALUES (?, ?)',
+                ('posts', posts))
+        connection.close()
+
+    @staticmethod
+    def run(path, pragmas, readers, writers, duration):
+        start = multiprocessing.Event()
+        results = multiprocessing.Queue()
+        roles = ['read'] * readers + ['write'] * writers
+        processes = [
+            multiprocessing.Process(
+                target=run_worker,
+                args=(path, pragmas, role, start, duration, results),
+            )
+            for role in roles
+        ]
+        for process in processes:
+            process.start()
+        start.set()
+        stats = {
+            role: {'operations': 0, 'errors': 0, 'latencies': []}
+            for role in ('read', 'write')
+        }
+        for _ in processes:
+            role, operations, errors, latencies = results.get()
+            stats[role]['operations'] += operations
+            stats[role]['errors'] += errors
+            stats[role]['latencies'].extend(latencies)
+        for process in processes:
+            process.join()
+        for role_stats in stats.values():
+            latencies = role_stats.pop('latencies')
+            role_stats['rate'] = role_stats['operations'] / duration
+            role_stats['p99'] = (
+                statistics.quantiles(latencies, n=100)[98]
+                if len(latencies) > 1 else 0.0
+            )
+        return stats
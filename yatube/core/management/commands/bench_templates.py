@@ -0,0 +1,72 @@
+import copy
+import statistics
+import time
+
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.core.management.base import BaseCommand
+from django.core.paginator import Paginator
+from django.template.loader import render_to_string
+from django.test import RequestFactory
+from django.test.utils import override_settings
+
+from core.template_cache import precompile_templates
+from posts.models import Post
+
+LOADERS = [
+    'django.template.loaders.filesystem.Loader',
+    'django.template.loaders.app_directories.Loader',
+]
+
+# Кеш-заглушка, чтобы карточки постов каждый раз отрисовывались заново
+DUMMY_CACHES = {
+    'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'},
+}
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает время отрисовки главной страницы при чтении шаблонов '
+        'с диска и из памяти после предварительной компиляции. Посты '
+        'загружаются один раз, поэтому замер не включает запросы к базе.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--renders', type=int, default=200)
+        parser.add_argument('--posts', type=int, default=10,
+                            help='Сколько постов на странице.')
+
+    def handle(self, renders, posts, **options):
+        request = RequestFactory().get('/')
+        request.user = AnonymousUser()
+        page = Paginator(
+            list(Post.objects.for_list()[:posts]), max(posts, 1)).page(1)
+        context = {'page_obj': page, 'title': 'Замер'}
+        for mode, loaders in (
+            ('filesystem', LOADERS),
+            ('precompiled', [('django.template.loaders.cached.Loader',
+                              LOADERS)]),
+        ):
+            with override_settings(TEMPLATES=self.templates(loaders),
+                                   CACHES=DUMMY_CACHES):
+                compiled = 0
+                if mode == 'precompiled':
+                    compiled = precompile_templates()
+                timings = []
+                for _ in range(renders):
+                    start = time.perf_counter()
+                    render_to_string('posts/index.html', context, request)
+                    timings.append((time.perf_counter() - start) * 1000)
+            self.stdout.write(
+                f'{mode:>12}: p50 {statistics.median(timings):.2f} мс, '
+                f'среднее {statistics.mean(timings):.2f} мс, '
+                f'первая {timings[0]:.2f} мс '
+                f'(скомпилировано шаблонов {compiled})'
+            )
+
+    @staticmethod
+    def templates(loaders):
+        templates = copy.deepcopy(settings.TEMPLATES)
+        templates[0]['APP_DIRS'] = False
+        templates[0]['OPTIONS']['loaders'] = loaders
+        return templates
@@ -0,0 +1,45 @@
+import sqlite3
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+
+class Command(BaseCommand):
+    help = (
+        'Копирует основную базу SQLite в файлы реплик из '
+        'DATABASE_REPLICAS через backup API. Заменяет репликацию при '
+        'локальной проверке чтения из реплик.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--interval', type=float, default=0,
+            help='Повторять копирование раз в столько секунд.',
+        )
+
+    def handle(self, interval, **options):
+        if not settings.DATABASE_REPLICAS:
+            raise CommandError('DATABASE_REPLICAS пуст')
+        while True:
+            started = time.monotonic()
+            for alias in settings.DATABASE_REPLICAS:
+                self.copy(connections['default'].settings_dict['NAME'],
+                          connections[alias].settings_dict['NAME'])
+            self.stdout.write(
+                f'Реплики обновлены за '
+                f'{(time.monotonic() - started) * 1000:.0f} мс')
+            if not interval:
+                return
+            time.sleep(interval)
+
+    @staticmethod
+    def copy(source_path, target_path):
+        source = sqlite3.connect(source_path)
+        target = sqlite3.connect(target_path)
+        try:
+            source.backup(target)
+        finally:
+            target.close()
+            source.close()
@@ -0,0 +1,191 @@
+"""Метрики запросов по представлениям.
+
+MetricsMiddleware замеряет для каждого запроса время ответа, число и
+время SQL-запросов, время отрисовки шаблонов и результат кеша страниц.
+Значения копятся в гистограммах текущего процесса по имени
+представления (posts:index и т.п.), отдаются страницей metrics и
+пишутся в лог core.metrics строкой JSON на каждый запрос.
+"""
+import json
+import logging
+import threading
+import time
+from bisect import bisect_left
+from collections import defaultdict
+from contextlib import ExitStack
+
+from django.db import connections
+from django.template.backends.django import DjangoTemplates, Template
+
+logger = logging.getLogger(__name__)
+
+# Верхние границы корзин гистограмм
+TIME_BUCKETS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+_state = threading.local()
+_lock = threading.Lock()
+
+
+class Histogram:
+    """Гистограмма с фиксированными корзинами и оценкой перцентилей."""
+
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.sum = 0
+        self.max = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    def quantile(self, q):
+        """Верхняя граница корзины, в которую попадает перцентиль q."""
+        if not self.count:
+            return 0
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.bounds, self.counts):
+            seen += count
+            if seen >= rank:
+                return min(bound, self.max)
+        return self.max
+
+    def as_dict(self):
+        buckets = {
+            str(bound): count for bound, count in zip(self.bounds, self.counts)
+        }
+        buckets['+Inf'] = self.counts[-1]
+        return {
+            'count': self.count,
+            'sum': round(self.sum, 3),
+            'max': round(self.max, 3),
+            'p50': self.quantile(0.5),
+            'p95': self.quantile(0.95),
+            'p99': self.quantile(0.99),
+            'buckets': buckets,
+        }
+
+
+class ViewMetrics:
+    def __init__(self):
+        self.wall_ms = Histogram(TIME_BUCKETS)
+        self.db_ms = Histogram(TIME_BUCKETS)
+        self.queries = Histogram(QUERY_BUCKETS)
+        self.template_ms = Histogram(TIME_BUCKETS)
+        self.page_cache = defaultdict(int)
+
+    def observe(self, sample):
+        self.wall_ms.observe(sample['wall_ms'])
+        self.db_ms.observe(sample['db_ms'])
+        self.queries.observe(sample['queries'])
+        self.template_ms.observe(sample['template_ms'])
+        if sample['page_cache']:
+            self.page_cache[sample['page_cache']] += 1
+
+    def as_dict(self):
+        return {
+            'wall_ms': self.wall_ms.as_dict(),
+            'db_ms': self.db_ms.as_dict(),
+            'queries': self.queries.as_dict(),
+            'template_ms': self.template_ms.as_dict(),
+            'page_cache': dict(self.page_cache),
+        }
+
+
+_views = defaultdict(ViewMetrics)
+
+
+def metrics_snapshot():
+    with _lock:
+        return {view: metrics.as_dict() for view, metrics in _views.items()}
+
+
+def reset_metrics():
+    with _lock:
+        _views.clear()
+
+
+class RequestMetrics:
+    """Счётчики одного запроса."""
+
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+        self.template_time = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries += 1
+            self.db_time += time.perf_counter() - started
+
+
+class TimedTemplate(Template):
+    def render(self, context=None, request=None):
+        # Вложенные отрисовки (render_to_string внутри тега) уже входят
+        # во время внешней, поэтому замеряется только внешняя
+        depth = getattr(_state, 'render_depth', 0)
+        _state.render_depth = depth + 1
+        started = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            _state.render_depth = depth
+            current = getattr(_state, 'current', None)
+            if current is not None and depth == 0:
+                current.template_time += time.perf_counter() - started
+
+
+class TimedDjangoTemplates(DjangoTemplates):
+    """Шаблонизатор Django, который учитывает время отрисовки.
+
+    Замеряется только отрисовка шаблона целиком, вложенные include и
+    отрисовки из тегов входят в его время.
+    """
+
+    def from_string(self, template_code):
+        return TimedTemplate(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        template = super().get_template(template_name)
+        return TimedTemplate(template.template, self)
+
+
+class MetricsMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        current = RequestMetrics()
+        _state.current = current
+        started = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(current))
+                response = self.get_response(request)
+        finally:
+            _state.current = None
+        match = request.resolver_match
+        if match is not None:
+            sample = {
+                'view': match.view_name,
+                'method': request.method,
+                'status': response.status_code,
+                'wall_ms': round((time.perf_counter() - started) * 1000, 2),
+                'db_ms': round(current.db_time * 1000, 2),
+                'queries': current.queries,
+                'template_ms': round(current.template_time * 1000, 2),
+                'page_cache': getattr(request, 'page_cache', None),
+            }
+            with _lock:
+                _views[match.view_name].observe(sample)
+            logger.info(json.dumps(sample, ensure_ascii=False))
+        return response
@@ -0,0 +1,147 @@
+"""Двухуровневый кеш объектов, которые ищутся почти на каждом запросе.
+
+Первый уровень — маленький LRU в памяти процесса, второй — общий кеш
+Django. Записи второго уровня хранят версию модели, с которой они
+построены. Сохранение или удаление объекта модели (сигналы) выдаёт
+новую версию и очищает первый уровень своего процесса. Другие процессы
+увидят изменение, когда истечёт их запись первого уровня, поэтому её
+срок local_timeout держат коротким. Сроки задаются для каждой модели в
+OBJECT_CACHE; модели, которых там нет, не кешируются. Если для модели
+задан список fields, кешируются только эти поля, остальные отложены:
+так в кеш не попадают, например, хеши паролей пользователей.
+
+Внутри транзакции кеш не используется: объект, прочитанный в
+транзакции, которая потом откатится, не должен пережить её в кеше.
+"""
+import hashlib
+import pickle
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from django.apps import apps
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.models.signals import post_delete, post_save
+from django.http import Http404
+
+from core.replicas import cap_timeout
+
+
+class LocalCache:
+    """LRU в памяти процесса со сроком жизни записей."""
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            expires, data = entry
+            if expires <= time.monotonic():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return data
+
+    def set(self, key, data, timeout):
+        with self.lock:
+            self.entries[key] = (time.monotonic() + timeout, data)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+    def clear(self, prefix=''):
+        with self.lock:
+            for key in [key for key in self.entries if key.startswith(prefix)]:
+                del self.entries[key]
+
+
+local_cache = LocalCache(settings.OBJECT_CACHE_LOCAL_SIZE)
+
+
+def version_key(label):
+    return f'objects:version:{label}'
+
+
+def object_key(label, lookup):
+    lookup = hashlib.md5(repr(sorted(lookup.items())).encode()).hexdigest()
+    return f'objects:{label}:{lookup}'
+
+
+def get_object(model, **lookup):
+    """Объект model по lookup из кеша; без записи в кеше — из базы.
+
+    Как и get, бросает model.DoesNotExist, если объекта нет. Каждый
+    вызов возвращает отдельную копию объекта.
+    """
+    label = model._meta.label_lower
+    options = settings.OBJECT_CACHE[label]
+    queryset = model._default_manager.all()
+    if 'fields' in options:
+        queryset = queryset.only(*options['fields'])
+    if in_transaction():
+        return queryset.get(**lookup)
+    key = object_key(label, lookup)
+    data = local_cache.get(key)
+    if data is not None:
+        return pickle.loads(data)
+    cached = cache.get_many([version_key(label), key])
+    version = cached.get(version_key(label)) or new_version(label)
+    entry = cached.get(key)
+    if entry is not None and entry[0] == version:
+        obj = entry[1]
+    else:
+        obj = queryset.get(**lookup)
+        # Объект из реплики может отставать от своей версии
+        cache.set(key, (version, obj), cap_timeout(options['timeout']))
+    local_cache.set(key, pickle.dumps(obj, pickle.HIGHEST_PROTOCOL),
+                    options['local_timeout'])
+    return obj
+
+
+def in_transaction():
+    # Без роутера: db_for_read отметил бы запрос как читавший реплику, и
+    # сроки записей в кешах укоротились бы даже при попадании в кеш
+    return connections[DEFAULT_DB_ALIAS].in_atomic_block
+
+
+def get_object_or_404(model, **lookup):
+    try:
+        return get_object(model, **lookup)
+    except model.DoesNotExist:
+        raise Http404(f'{model._meta.object_name} не найден')
+
+
+def new_version(label):
+    cache.add(version_key(label), uuid.uuid4().hex, None)
+    return cache.get(version_key(label))
+
+
+def invalidate(sender, update_fields=None, **kwargs):
+    """Сбрасывает кеш объектов модели sender.
+
+    Сохранение только полей из ignore_updates (например, last_login при
+    входе пользователя) кеш не сбрасывает.
+    """
+    label = sender._meta.label_lower
+    ignored = settings.OBJECT_CACHE[label].get('ignore_updates', ())
+    if update_fields and set(update_fields) <= set(ignored):
+        return
+    cache.set(version_key(label), uuid.uuid4().hex, None)
+    local_cache.clear(f'objects:{label}:')
+
+
+def connect_signals():
+    for label in settings.OBJECT_CACHE:
+        model = apps.get_model(label)
+        post_save.connect(invalidate, sender=model,
+                          dispatch_uid=f'object_cache:{label}')
+        post_delete.connect(invalidate, sender=model,
+                            dispatch_uid=f'object_cache:{label}')
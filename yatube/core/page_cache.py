@@ -0,0 +1,162 @@
+"""Кеширование страниц с версионированными ключами.
+
+Запись страницы помнит номер поколения, который увеличивается при
+любом изменении контента (см. bump_generation). Запись другого
+поколения считается устаревшей, поэтому TTL можно держать большим,
+а новые посты видны сразу.
+"""
+import hashlib
+import threading
+import time
+from collections import defaultdict
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+
+from core.replicas import cap_timeout
+
+GENERATION_KEY = 'pages:generation'
+LOCK_POLL_INTERVAL = 0.05
+
+_stats = defaultdict(lambda: {'hits': 0, 'stale': 0, 'misses': 0})
+_stats_lock = threading.Lock()
+
+
+def get_generation():
+    generation = cache.get(GENERATION_KEY)
+    if generation is None:
+        cache.add(GENERATION_KEY, 1, timeout=None)
+        generation = cache.get(GENERATION_KEY, 1)
+    return generation
+
+
+def bump_generation():
+    """Делает недействительными все закешированные страницы."""
+    try:
+        cache.incr(GENERATION_KEY)
+    except ValueError:
+        cache.add(GENERATION_KEY, 1, timeout=None)
+
+
+def page_cache_key(key_prefix, request):
+    """Ключ страницы: пользователь и полный путь с GET-параметрами."""
+    user = request.user.pk if request.user.is_authenticated else 'anon'
+    url = hashlib.md5(request.get_full_path().encode()).hexdigest()
+    return f'page:{key_prefix}:{user}:{url}'
+
+
+def record(request, key_prefix, event):
+    """Учитывает событие кеша и запоминает его в запросе для метрик."""
+    request.page_cache = event
+    with _stats_lock:
+        _stats[key_prefix][event] += 1
+
+
+def page_cache_stats():
+    """Попадания, промахи и перестроения кеша страниц текущего процесса.
+
+    stale — запросы, получившие устаревшую копию, пока страницу
+    перестраивал другой запрос; они тоже считаются попаданиями.
+    """
+    with _stats_lock:
+        stats = {}
+        for key_prefix, counts in _stats.items():
+            hits = counts['hits'] + counts['stale']
+            total = hits + counts['misses']
+            stats[key_prefix] = {
+                **counts,
+                'hit_rate': hits / total if total else 0.0,
+            }
+        return stats
+
+
+def reset_page_cache_stats():
+    with _stats_lock:
+        _stats.clear()
+
+
+def tag_page(request, *tags):
+    """Отмечает, от каких объектов зависит страница запроса; по тегам
+    кеш анонимных страниц (core.anonymous_cache) находит, какие страницы
+    сбросить."""
+    if not hasattr(request, 'page_tags'):
+        request.page_tags = set()
+    request.page_tags.update(tags)
+
+
+class CachedPage:
+    """Закешированный ответ с поколением, мягким сроком годности и
+    тегами страницы."""
+
+    def __init__(self, response, generation, expires, tags):
+        self.response = response
+        self.generation = generation
+        self.expires = expires
+        self.tags = tags
+
+    def is_fresh(self, generation):
+        return self.generation == generation and time.time() < self.expires
+
+
+def cache_page_versioned(timeout, key_prefix):
+    """Аналог cache_page с поколениями и защитой от лавины промахов.
+
+    Через timeout секунд или после смены поколения запись считается
+    устаревшей, но хранится ещё PAGE_CACHE_STALE_TIMEOUT секунд. Страницу
+    перестраивает только запрос, захвативший блокировку ключа, остальные
+    в это время получают устаревшую копию. Если копии нет совсем,
+    остальные запросы ждут перестроения не дольше PAGE_CACHE_LOCK_WAIT.
+    """
+    def decorator(view_func):
+        @wraps(view_func)
+        def wrapper(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return view_func(request, *args, **kwargs)
+            key = page_cache_key(key_prefix, request)
+            generation = get_generation()
+            cached = cache.get(key)
+            if cached is not None and cached.is_fresh(generation):
+                record(request, key_prefix, 'hits')
+                tag_page(request, *cached.tags)
+                return cached.response
+            lock_key = f'{key}:lock'
+            locked = cache.add(lock_key, 1, settings.PAGE_CACHE_LOCK_TIMEOUT)
+            if not locked:
+                if cached is None:
+                    cached = wait_for_page(key)
+                if cached is not None:
+                    record(request, key_prefix, 'stale')
+                    tag_page(request, *cached.tags)
+                    return cached.response
+            record(request, key_prefix, 'misses')
+            try:
+                response = view_func(request, *args, **kwargs)
+                if response.status_code == 200 and not response.streaming:
+                    store_page(key, response, generation, timeout,
+                               getattr(request, 'page_tags', set()))
+                return response
+            finally:
+                if locked:
+                    cache.delete(lock_key)
+        return wrapper
+    return decorator
+
+
+def store_page(key, response, generation, timeout, tags):
+    # Реплика могла ещё не получить изменения этого поколения, поэтому
+    # такая страница свежа не дольше отставания реплик
+    timeout = cap_timeout(timeout)
+    page = CachedPage(response, generation, time.time() + timeout, tags)
+    cache.set(key, page, timeout + settings.PAGE_CACHE_STALE_TIMEOUT)
+
+
+def wait_for_page(key):
+    """Ждёт, пока страницу перестроит запрос, захвативший блокировку."""
+    deadline = time.monotonic() + settings.PAGE_CACHE_LOCK_WAIT
+    while time.monotonic() < deadline:
+        time.sleep(LOCK_POLL_INTERVAL)
+        cached = cache.get(key)
+        if cached is not None:
+            return cached
+    return None
@@ -0,0 +1,101 @@
+"""Бюджеты SQL-запросов для представлений.
+
+Декоратор query_budget задаёт, сколько запросов и миллисекунд работы с
+базой допустимо для одного вызова представления. Превышение в режиме
+QUERY_BUDGET_MODE = 'raise' (разработка и тесты) вызывает
+QueryBudgetExceeded, в режиме 'log' пишется в лог core.query_budget
+вместе с выполненным SQL, в режиме 'off' бюджеты не проверяются. Режим
+'raise' включает тестовый раннер (core.test_runner), чтобы превышение
+бюджета не превращалось у пользователя в ошибку 500.
+
+Код, число запросов которого растёт с данными (пакеты bulk_create,
+источники ленты), расширяет бюджет текущего представления через
+allow_queries.
+"""
+import logging
+import threading
+import time
+from contextlib import ExitStack
+from functools import wraps
+
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+_state = threading.local()
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+# Служебные команды транзакций не считаются запросами
+TRANSACTION_COMMANDS = ('SAVEPOINT', 'RELEASE SAVEPOINT', 'ROLLBACK TO')
+
+
+class QueryLog:
+    """Запоминает SQL и время запросов, выполненных представлением."""
+
+    def __init__(self):
+        self.queries = []
+        self.db_time = 0.0
+        self.allowance = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_time += time.perf_counter() - started
+            if not sql.startswith(TRANSACTION_COMMANDS):
+                self.queries.append(sql)
+
+
+def query_budget(queries, db_ms=None):
+    """Ограничивает число запросов и время работы с базой; без db_ms
+    действует QUERY_BUDGET_DB_MS."""
+    def decorator(view_func):
+        @wraps(view_func)
+        def wrapper(request, *args, **kwargs):
+            if settings.QUERY_BUDGET_MODE == 'off':
+                return view_func(request, *args, **kwargs)
+            log = QueryLog()
+            previous = getattr(_state, 'log', None)
+            _state.log = log
+            try:
+                with ExitStack() as stack:
+                    for connection in connections.all():
+                        stack.enter_context(connection.execute_wrapper(log))
+                    response = view_func(request, *args, **kwargs)
+            finally:
+                _state.log = previous
+            check(view_func.__name__, log, queries,
+                  db_ms or settings.QUERY_BUDGET_DB_MS)
+            return response
+        return wrapper
+    return decorator
+
+
+def allow_queries(count):
+    """Разрешает текущему представлению ещё count запросов."""
+    log = getattr(_state, 'log', None)
+    if log is not None:
+        log.allowance += count
+
+
+def check(view_name, log, queries, db_ms):
+    problems = []
+    queries += log.allowance
+    if len(log.queries) > queries:
+        problems.append(f'запросов {len(log.queries)} при бюджете {queries}')
+    if log.db_time * 1000 > db_ms:
+        problems.append(
+            f'время базы {log.db_time * 1000:.1f} мс при бюджете {db_ms} мс')
+    if not problems:
+        return
+    message = '{}: {}\n{}'.format(
+        view_name, ', '.join(problems), '\n'.join(log.queries))
+    if settings.QUERY_BUDGET_MODE == 'raise':
+        raise QueryBudgetExceeded(message)
+    logger.warning(message)
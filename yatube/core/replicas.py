@@ -0,0 +1,92 @@
+"""Чтение из реплик базы данных.
+
+Запросы на чтение внутри представлений, помеченных read_from_replica,
+уходят на случайную реплику из DATABASE_REPLICAS, всё остальное — на
+основную базу. Чтобы пользователь сразу видел свои изменения, после
+запроса с записью ReplicaPinMiddleware ставит cookie, и ещё
+REPLICA_PIN_TIMEOUT секунд (ожидаемое отставание реплик) его запросы
+читают основную базу.
+"""
+import random
+import threading
+from functools import wraps
+
+from django.conf import settings
+
+PIN_COOKIE = 'pin_primary'
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS', 'TRACE')
+
+_state = threading.local()
+
+
+def used_replica():
+    """Читал ли текущий запрос данные из реплики."""
+    return getattr(_state, 'used_replica', False)
+
+
+def cap_timeout(timeout):
+    """Срок хранения в кеше данных текущего запроса: прочитанное из
+    реплики может отставать, поэтому живёт не дольше её отставания."""
+    if used_replica():
+        return min(timeout, settings.REPLICA_PIN_TIMEOUT)
+    return timeout
+
+
+def read_from_replica(view_func):
+    """Направляет чтения представления на реплики."""
+    @wraps(view_func)
+    def wrapper(request, *args, **kwargs):
+        previous = getattr(_state, 'replica', False)
+        _state.replica = True
+        try:
+            return view_func(request, *args, **kwargs)
+        finally:
+            _state.replica = previous
+    return wrapper
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if not settings.DATABASE_REPLICAS:
+            return None
+        if not getattr(_state, 'replica', False):
+            return None
+        if getattr(_state, 'pinned', False):
+            return None
+        _state.used_replica = True
+        return random.choice(settings.DATABASE_REPLICAS)
+
+    def db_for_write(self, model, **hints):
+        _state.wrote = True
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Реплики получают схему вместе с данными при копировании
+        return db not in settings.DATABASE_REPLICAS
+
+
+class ReplicaPinMiddleware:
+    """Закрепляет за основной базой пользователя, который только что
+    что-то записал."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        _state.pinned = PIN_COOKIE in request.COOKIES
+        _state.wrote = False
+        _state.used_replica = False
+        try:
+            response = self.get_response(request)
+            if _state.wrote and request.method not in SAFE_METHODS:
+                response.set_cookie(
+                    PIN_COOKIE, '1',
+                    max_age=settings.REPLICA_PIN_TIMEOUT,
+                    httponly=True,
+                )
+            return response
+        finally:
+            _state.pinned = _state.wrote = _state.used_replica = False
@@ -0,0 +1,22 @@
+"""Настройка соединений SQLite.
+
+К каждому новому соединению применяются PRAGMA из SQLITE_PRAGMAS, в боевом
+режиме это SQLITE_PRODUCTION_PRAGMAS. В режиме WAL читатели не ждут
+писателя, а busy_timeout заставляет конкурирующих писателей ждать
+блокировку вместо ошибки «database is locked».
+"""
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+
+def apply_pragmas(connection, pragmas):
+    """Выполняет PRAGMA на соединении sqlite3."""
+    for name, value in pragmas.items():
+        connection.execute(f'PRAGMA {name} = {value}')
+
+
+@receiver(connection_created)
+def configure_connection(sender, connection, **kwargs):
+    if connection.vendor == 'sqlite':
+        apply_pragmas(connection.connection, settings.SQLITE_PRAGMAS)
@@ -0,0 +1,342 @@
+"""Кеш в файле SQLite, общий для всех процессов хоста.
+
+У LocMemCache каждый процесс держит свою копию кеша: с ростом числа
+воркеров падает доля попаданий, а сброс кеша в одном воркере не доходит
+до остальных. SQLiteCache хранит записи в одном файле SQLite в режиме
+WAL, поэтому все воркеры видят одни и те же записи и одни поколения
+страниц, а внешний сервис не нужен.
+
+Объём значений ограничен OPTIONS['MAX_SIZE'] байт. Когда он превышен,
+сначала удаляются просроченные записи, затем давно не читанные (LRU),
+пока объём не опустится до CULL_TARGET от предела. Время чтения записи
+обновляется не чаще раза в ACCESS_RESOLUTION секунд, чтобы чтения не
+превращались в запись. Попадания, промахи и вытеснения копятся в
+процессе и раз в STATS_FLUSH_INTERVAL секунд прибавляются к общей
+таблице; stats() возвращает суммы по всем процессам.
+"""
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+CULL_TARGET = 0.9
+BUSY_TIMEOUT = 5
+# Сколько ключей удалять или читать одним запросом
+CHUNK_SIZE = 500
+STATS = ('hits', 'misses', 'evictions')
+
+SCHEMA = (
+    """
+    CREATE TABLE IF NOT EXISTS cache_entries (
+        key TEXT PRIMARY KEY,
+        value BLOB NOT NULL,
+        expires REAL,
+        accessed REAL NOT NULL,
+        size INTEGER NOT NULL
+    )
+    """,
+    'CREATE INDEX IF NOT EXISTS cache_entries_accessed '
+    'ON cache_entries (accessed)',
+    'CREATE INDEX IF NOT EXISTS cache_entries_expires '
+    'ON cache_entries (expires)',
+    """
+    CREATE TABLE IF NOT EXISTS cache_stats (
+        name TEXT PRIMARY KEY,
+        value INTEGER NOT NULL
+    )
+    """,
+    "INSERT OR IGNORE INTO cache_stats VALUES "
+    "('hits', 0), ('misses', 0), ('evictions', 0), ('size', 0)",
+    # Общий объём значений поддерживают триггеры, чтобы не считать SUM
+    """
+    CREATE TRIGGER IF NOT EXISTS cache_entries_insert
+    AFTER INSERT ON cache_entries BEGIN
+        UPDATE cache_stats SET value = value + new.size WHERE name = 'size';
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS cache_entries_delete
+    AFTER DELETE ON cache_entries BEGIN
+        UPDATE cache_stats SET value = value - old.size WHERE name = 'size';
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS cache_entries_update
+    AFTER UPDATE OF size ON cache_entries BEGIN
+        UPDATE cache_stats SET value = value + new.size - old.size
+        WHERE name = 'size';
+    END
+    """,
+)
+
+UPSERT = (
+    'INSERT INTO cache_entries (key, value, expires, accessed, size) '
+    'VALUES (?, ?, ?, ?, ?) ON CONFLICT (key) DO UPDATE SET '
+    'value = excluded.value, expires = excluded.expires, '
+    'accessed = excluded.accessed, size = excluded.size'
+)
+
+
+def chunks(items, size=CHUNK_SIZE):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def placeholders(items):
+    return ', '.join('?' * len(items))
+
+
+class SQLiteCache(BaseCache):
+    def __init__(self, location, params):
+        super().__init__(params)
+        self.path = location
+        options = params.get('OPTIONS', {})
+        self.max_size = int(options.get('MAX_SIZE', 64 * 1024 * 1024))
+        self.access_resolution = float(options.get('ACCESS_RESOLUTION', 1))
+        self.stats_flush_interval = float(
+            options.get('STATS_FLUSH_INTERVAL', 5))
+        self._connection = None
+        self._pid = None
+        self._lock = threading.RLock()
+        self._pending = dict.fromkeys(STATS, 0)
+        self._flushed = time.monotonic()
+
+    @property
+    def connection(self):
+        # После fork соединение родителя использовать нельзя
+        if self._connection is None or self._pid != os.getpid():
+            self._connection = self.connect()
+            self._pid = os.getpid()
+        return self._connection
+
+    def connect(self):
+        connection = sqlite3.connect(
+            self.path, timeout=BUSY_TIMEOUT, isolation_level=None,
+            check_same_thread=False,
+        )
+        connection.execute('PRAGMA journal_mode = WAL')
+        connection.execute('PRAGMA synchronous = NORMAL')
+        with self.write(connection):
+            for statement in SCHEMA:
+                connection.execute(statement)
+        return connection
+
+    @contextmanager
+    def write(self, connection=None):
+        """Транзакция записи; блокировка берётся сразу, чтобы
+        конкурирующие процессы ждали её, а не получали ошибку."""
+        with self._lock:
+            connection = connection or self.connection
+            connection.execute('BEGIN IMMEDIATE')
+            try:
+                yield connection
+            except BaseException:
+                connection.execute('ROLLBACK')
+                raise
+            connection.execute('COMMIT')
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        row = self.make_row(key, value, timeout)
+        with self.write() as connection:
+            # Занятой считается только непросроченная запись
+            added = connection.execute(
+                UPSERT + ' WHERE cache_entries.expires <= ?',
+                (*row, time.time()),
+            ).rowcount
+            self.cull(connection)
+        self.flush_stats_later()
+        return bool(added)
+
+    def get(self, key, default=None, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        return self.read([key]).get(key, default)
+
+    def get_many(self, keys, version=None):
+        names = {self.make_key(key, version=version): key for key in keys}
+        for key in names:
+            self.validate_key(key)
+        values = self.read(list(names))
+        return {names[key]: value for key, value in values.items()}
+
+    def read(self, keys):
+        now = time.time()
+        values = {}
+        stale = []
+        with self._lock:
+            for part in chunks(keys):
+                rows = self.connection.execute(
+                    'SELECT key, value, expires, accessed FROM cache_entries '
+                    f'WHERE key IN ({placeholders(part)})', part,
+                )
+                for key, value, expires, accessed in rows:
+                    if expires is not None and expires <= now:
+                        continue
+                    values[key] = pickle.loads(value)
+                    if now - accessed >= self.access_resolution:
+                        stale.append(key)
+            if stale:
+                self.touch_accessed(stale, now)
+            self._pending['hits'] += len(values)
+            self._pending['misses'] += len(keys) - len(values)
+        self.flush_stats_later()
+        return values
+
+    def touch_accessed(self, keys, now):
+        for part in chunks(keys):
+            self.connection.execute(
+                'UPDATE cache_entries SET accessed = ? '
+                f'WHERE key IN ({placeholders(part)})', (now, *part),
+            )
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        self.set_rows([self.make_row(key, value, timeout)])
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        rows = []
+        for key, value in data.items():
+            key = self.make_key(key, version=version)
+            self.validate_key(key)
+            rows.append(self.make_row(key, value, timeout))
+        self.set_rows(rows)
+        return []
+
+    def make_row(self, key, value, timeout):
+        pickled = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        expires = self.get_backend_timeout(timeout)
+        return key, pickled, expires, time.time(), len(pickled)
+
+    def set_rows(self, rows):
+        with self.write() as connection:
+            connection.executemany(UPSERT, rows)
+            self.cull(connection)
+        self.flush_stats_later()
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        with self.write() as connection:
+            return bool(connection.execute(
+                'UPDATE cache_entries SET expires = ? WHERE key = ? '
+                'AND (expires IS NULL OR expires > ?)',
+                (self.get_backend_timeout(timeout), key, time.time()),
+            ).rowcount)
+
+    def incr(self, key, delta=1, version=None):
+        """Атомарное приращение: чтение и запись в одной транзакции."""
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        with self.write() as connection:
+            row = connection.execute(
+                'SELECT value FROM cache_entries WHERE key = ? '
+                'AND (expires IS NULL OR expires > ?)', (key, time.time()),
+            ).fetchone()
+            if row is None:
+                raise ValueError(f"Key '{key}' not found")
+            value = pickle.loads(row[0]) + delta
+            pickled = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+            connection.execute(
+                'UPDATE cache_entries SET value = ?, size = ? WHERE key = ?',
+                (pickled, len(pickled), key),
+            )
+        return value
+
+    def has_key(self, key, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        with self._lock:
+            return self.connection.execute(
+                'SELECT 1 FROM cache_entries WHERE key = ? '
+                'AND (expires IS NULL OR expires > ?)', (key, time.time()),
+            ).fetchone() is not None
+
+    def delete(self, key, version=None):
+        self.delete_many([key], version=version)
+
+    def delete_many(self, keys, version=None):
+        names = [self.make_key(key, version=version) for key in keys]
+        for key in names:
+            self.validate_key(key)
+        with self.write() as connection:
+            for part in chunks(names):
+                connection.execute(
+                    'DELETE FROM cache_entries '
+                    f'WHERE key IN ({placeholders(part)})', part,
+                )
+
+    def clear(self):
+        with self.write() as connection:
+            connection.execute('DELETE FROM cache_entries')
+
+    def cull(self, connection):
+        """Удаляет просроченные, затем давно не читанные записи, пока
+        объём не опустится до CULL_TARGET от MAX_SIZE."""
+        if self.total_size(connection) <= self.max_size:
+            return
+        connection.execute(
+            'DELETE FROM cache_entries WHERE expires <= ?', (time.time(),))
+        excess = self.total_size(connection) - self.max_size * CULL_TARGET
+        if excess <= 0:
+            return
+        victims = []
+        rows = connection.execute(
+            'SELECT key, size FROM cache_entries ORDER BY accessed')
+        for key, size in rows:
+            victims.append(key)
+            excess -= size
+            if excess <= 0:
+                break
+        for part in chunks(victims):
+            connection.execute(
+                'DELETE FROM cache_entries '
+                f'WHERE key IN ({placeholders(part)})', part,
+            )
+        self._pending['evictions'] += len(victims)
+
+    @staticmethod
+    def total_size(connection):
+        return connection.execute(
+            "SELECT value FROM cache_stats WHERE name = 'size'"
+        ).fetchone()[0]
+
+    def flush_stats_later(self):
+        if time.monotonic() - self._flushed >= self.stats_flush_interval:
+            self.flush_stats()
+
+    def flush_stats(self):
+        """Прибавляет счётчики процесса к общей таблице."""
+        with self._lock:
+            pending = [
+                (value, name) for name, value in self._pending.items()
+                if value
+            ]
+            self._pending = dict.fromkeys(STATS, 0)
+            self._flushed = time.monotonic()
+            if pending:
+                with self.write() as connection:
+                    connection.executemany(
+                        'UPDATE cache_stats SET value = value + ? '
+                        'WHERE name = ?', pending,
+                    )
+
+    def stats(self):
+        """Попадания, промахи и вытеснения всех процессов, число записей
+        и объём значений в байтах."""
+        self.flush_stats()
+        with self._lock:
+            stats = dict(self.connection.execute(
+                'SELECT name, value FROM cache_stats'))
+            stats['entries'] = self.connection.execute(
+                'SELECT COUNT(*) FROM cache_entries').fetchone()[0]
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = stats['hits'] / lookups if lookups else 0.0
+        stats['max_size'] = self.max_size
+        return stats
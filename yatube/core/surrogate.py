@@ -0,0 +1,86 @@
+"""Ключи и сброс страниц во внешнем кеширующем прокси.
+
+SurrogateKeyMiddleware выводит теги страницы (см. core.page_cache.tag_page)
+в заголовке Surrogate-Key, по которому прокси группирует закешированные
+ответы. Сброс тегов (core.anonymous_cache.purge) передаётся диспетчеру:
+он копит ключи SURROGATE_PURGE_DELAY секунд после первого из них и
+отправляет их на SURROGATE_PURGE_URL POST-запросами по
+SURROGATE_PURGE_BATCH ключей в заголовке Surrogate-Key. Так серия
+записей превращается в один запрос к прокси. Без SURROGATE_PURGE_URL
+ключи не отправляются.
+"""
+import logging
+import threading
+import urllib.request
+
+from django.conf import settings
+from django.db import transaction
+
+logger = logging.getLogger(__name__)
+
+HEADER = 'Surrogate-Key'
+
+
+class SurrogateKeyMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        tags = getattr(request, 'page_tags', None)
+        if tags:
+            response[HEADER] = ' '.join(sorted(tags))
+        return response
+
+
+class PurgeDispatcher:
+    """Копит ключи для сброса и отправляет их пачками из фонового
+    потока."""
+
+    def __init__(self):
+        self.keys = set()
+        self.timer = None
+        self.lock = threading.Lock()
+
+    def add(self, keys):
+        with self.lock:
+            self.keys.update(keys)
+            if self.timer is None:
+                self.timer = threading.Timer(
+                    settings.SURROGATE_PURGE_DELAY, self.flush)
+                self.timer.daemon = True
+                self.timer.start()
+
+    def flush(self):
+        with self.lock:
+            keys = sorted(self.keys)
+            self.keys = set()
+            self.timer = None
+        batch = settings.SURROGATE_PURGE_BATCH
+        for start in range(0, len(keys), batch):
+            send(keys[start:start + batch])
+
+
+def send(keys):
+    request = urllib.request.Request(
+        settings.SURROGATE_PURGE_URL, method='POST',
+        headers={**settings.SURROGATE_PURGE_HEADERS, HEADER: ' '.join(keys)},
+    )
+    try:
+        with urllib.request.urlopen(
+                request, timeout=settings.SURROGATE_PURGE_TIMEOUT):
+            pass
+    except OSError:
+        # Прокси всё равно забудет страницы по своему TTL
+        logger.exception('Не удалось сбросить ключи %s', ' '.join(keys))
+
+
+dispatcher = PurgeDispatcher()
+
+
+def purge_later(keys):
+    """Сбрасывает ключи в прокси после фиксации текущей транзакции:
+    раньше прокси успел бы снова закешировать старые страницы."""
+    if settings.SURROGATE_PURGE_URL:
+        keys = list(keys)
+        transaction.on_commit(lambda: dispatcher.add(keys))
@@ -0,0 +1,78 @@
+"""Предварительная компиляция шаблонов.
+
+В боевом режиме (TEMPLATES_PRECOMPILE) шаблоны загружаются через
+cached.Loader, а precompile_templates при запуске процесса компилирует
+все шаблоны из каталогов загрузчиков, так что запросы не читают и не
+разбирают файлы с диска. Проверка check_templates находит сломанные
+шаблоны при запуске manage.py, а не на первом запросе к странице.
+"""
+import os
+
+from django.core import checks
+from django.core.exceptions import ImproperlyConfigured
+from django.template import TemplateSyntaxError, engines
+from django.template.backends.django import DjangoTemplates
+
+
+def get_loaders(engine):
+    """Загрузчики движка, включая вложенные в cached.Loader."""
+    for loader in engine.template_loaders:
+        yield loader
+        yield from getattr(loader, 'loaders', ())
+
+
+def template_names(engine):
+    """Имена всех шаблонов в каталогах загрузчиков движка."""
+    names = set()
+    for loader in get_loaders(engine):
+        if not hasattr(loader, 'get_dirs'):
+            continue
+        for directory in loader.get_dirs():
+            for root, _, files in os.walk(directory):
+                for file_name in files:
+                    path = os.path.join(root, file_name)
+                    name = os.path.relpath(path, directory)
+                    names.add(name.replace(os.sep, '/'))
+    return sorted(names)
+
+
+def compile_templates():
+    """Компилирует все шаблоны движков Django.
+
+    Возвращает число скомпилированных шаблонов и список пар (имя,
+    ошибка) для шаблонов, которые не удалось разобрать.
+    """
+    compiled = 0
+    errors = []
+    for backend in engines.all():
+        if not isinstance(backend, DjangoTemplates):
+            continue
+        for name in template_names(backend.engine):
+            try:
+                backend.engine.get_template(name)
+            except (TemplateSyntaxError, UnicodeDecodeError) as error:
+                errors.append((name, error))
+            else:
+                compiled += 1
+    return compiled, errors
+
+
+def precompile_templates():
+    """Заполняет кеш шаблонов; сломанный шаблон останавливает запуск."""
+    compiled, errors = compile_templates()
+    if errors:
+        raise ImproperlyConfigured('Сломанные шаблоны: ' + ', '.join(
+            f'{name} ({error})' for name, error in errors))
+    return compiled
+
+
+@checks.register(checks.Tags.templates)
+def check_templates(app_configs, **kwargs):
+    _, errors = compile_templates()
+    return [
+        checks.Error(
+            f'Шаблон {name} не компилируется: {error}',
+            id='core.E001',
+        )
+        for name, error in errors
+    ]
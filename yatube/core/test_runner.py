@@ -0,0 +1,16 @@
+from django.conf import settings
+from django.test.runner import DiscoverRunner
+
+
+class TestRunner(DiscoverRunner):
+    """Тесты проверяют бюджеты запросов строго: превышение — ошибка,
+    а не запись в лог, как при обычной работе."""
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self.query_budget_mode = settings.QUERY_BUDGET_MODE
+        settings.QUERY_BUDGET_MODE = 'raise'
+
+    def teardown_test_environment(self, **kwargs):
+        settings.QUERY_BUDGET_MODE = self.query_budget_mode
+        super().teardown_test_environment(**kwargs)
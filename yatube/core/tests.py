@@ -1,5 +1,38 @@
-from django.test import TestCase, Client
+import copy
+import itertools
+import pickle
+import queue
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser, User
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connection
+from django.template import engines
+from django.http import Http404, HttpResponse
+from django.test import TestCase, Client, RequestFactory, override_settings
 from http import HTTPStatus
+from unittest import mock
+
+from core import object_cache
+from core.metrics import RequestMetrics, reset_metrics
+from core.query_budget import QueryBudgetExceeded, query_budget
+from core.page_cache import (
+    bump_generation, cache_page_versioned, page_cache_key
+)
+from core.replicas import (
+    PIN_COOKIE, ReplicaPinMiddleware, ReplicaRouter, cap_timeout,
+    read_from_replica, used_replica,
+)
+from core.sqlite import apply_pragmas, configure_connection
+from core.sqlite_cache import SQLiteCache
+from core.surrogate import PurgeDispatcher
+from core.template_cache import check_templates, precompile_templates
+from posts.models import Post
 
 
 class CorePagesURLTests(TestCase):
@@ -11,3 +44,388 @@ class CorePagesURLTests(TestCase):
         response = self.guest_client.get('/test-page/')
         self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
         self.assertTemplateUsed(response, 'core/404.html')
+
+
+class PageCacheTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.calls = 0
+
+        def view(request):
+            self.calls += 1
+            return HttpResponse(f'версия {self.calls}')
+
+        self.view = cache_page_versioned(60, key_prefix='test')(view)
+        self.request = RequestFactory().get('/')
+        self.request.user = AnonymousUser()
+
+    def test_stale_page_served_while_locked(self):
+        """Пока страницу перестраивает другой запрос, отдаётся старая
+        копия."""
+        self.view(self.request)
+        bump_generation()
+        key = page_cache_key('test', self.request)
+        cache.add(f'{key}:lock', 1)
+        response = self.view(self.request)
+        self.assertEqual(response.content.decode(), 'версия 1')
+        self.assertEqual(self.calls, 1)
+
+    def test_page_rebuilt_once_after_change(self):
+        """После смены поколения страницу перестраивает один запрос."""
+        self.view(self.request)
+        bump_generation()
+        response = self.view(self.request)
+        self.assertEqual(response.content.decode(), 'версия 2')
+        self.view(self.request)
+        self.assertEqual(self.calls, 2)
+
+
+class SqlitePragmasTest(TestCase):
+    def test_pragmas_applied_to_connection(self):
+        """PRAGMA из настроек применяются к соединению SQLite."""
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA busy_timeout')
+            busy_timeout = cursor.fetchone()[0]
+        self.addCleanup(apply_pragmas, connection.connection, {
+            'busy_timeout': busy_timeout,
+        })
+        with override_settings(SQLITE_PRAGMAS={'busy_timeout': 1234}):
+            configure_connection(None, connection)
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA busy_timeout')
+            self.assertEqual(cursor.fetchone()[0], 1234)
+
+
+@override_settings(DATABASE_REPLICAS=['replica'])
+class ReplicaRouterTest(TestCase):
+    def setUp(self):
+        self.router = ReplicaRouter()
+        self.factory = RequestFactory()
+
+    def read_db(self, request):
+        """База, из которой представление с репликами читает посты."""
+        result = {}
+
+        @read_from_replica
+        def view(request):
+            result['db'] = self.router.db_for_read(None)
+            return HttpResponse()
+
+        ReplicaPinMiddleware(view)(request)
+        return result['db']
+
+    def test_reads_routed_to_replica(self):
+        """Чтения представлений с репликами уходят на реплику, остальные
+        на основную базу."""
+        self.assertEqual(self.read_db(self.factory.get('/')), 'replica')
+        self.assertIsNone(self.router.db_for_read(None))
+
+    def test_writer_pinned_to_primary(self):
+        """После записи пользователь читает основную базу."""
+        def write_view(request):
+            self.router.db_for_write(None)
+            return HttpResponse()
+
+        response = ReplicaPinMiddleware(write_view)(self.factory.post('/'))
+        self.assertIn(PIN_COOKIE, response.cookies)
+        request = self.factory.get('/')
+        request.COOKIES[PIN_COOKIE] = response.cookies[PIN_COOKIE].value
+        self.assertIsNone(self.read_db(request))
+
+    @override_settings(REPLICA_PIN_TIMEOUT=5)
+    def test_replica_reads_cap_timeout(self):
+        """Данные, прочитанные из реплики, кешируются не дольше её
+        отставания."""
+        @read_from_replica
+        def view(request):
+            self.router.db_for_read(None)
+            return HttpResponse(f'{cap_timeout(60)} {cap_timeout(2)}')
+
+        response = ReplicaPinMiddleware(view)(self.factory.get('/'))
+        self.assertEqual(response.content, b'5 2')
+        self.assertEqual(cap_timeout(60), 60)
+
+    def test_object_cache_check_is_not_replica_read(self):
+        """Проверка транзакции в кеше объектов не отмечает запрос как
+        читавший реплику."""
+        @read_from_replica
+        def view(request):
+            object_cache.in_transaction()
+            return HttpResponse(str(used_replica()))
+
+        response = ReplicaPinMiddleware(view)(self.factory.get('/'))
+        self.assertEqual(response.content, b'False')
+
+
+class MetricsTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        reset_metrics()
+        self.client = Client()
+
+    def test_view_metrics_collected(self):
+        """Метрики запроса копятся по имени представления."""
+        staff = User.objects.create_user(username='staff', is_staff=True)
+        self.client.get('/')
+        self.client.get('/')
+        self.client.force_login(staff)
+        metrics = self.client.get('/internal/metrics/').json()
+        index = metrics['posts:index']
+        self.assertEqual(index['wall_ms']['count'], 2)
+        self.assertGreater(index['queries']['sum'], 0)
+        self.assertEqual(index['template_ms']['count'], 2)
+        self.assertEqual(index['page_cache'], {'misses': 1, 'hits': 1})
+
+    def test_metrics_hidden_from_other_users(self):
+        """Страница метрик недоступна без прав сотрудника, в том числе с
+        локального адреса."""
+        for address in ('127.0.0.1', '10.0.0.1'):
+            with self.subTest(address=address):
+                response = self.client.get('/internal/metrics/',
+                                           REMOTE_ADDR=address)
+                self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
+
+    @override_settings(METRICS_TOKEN='secret')
+    def test_metrics_token(self):
+        """Страница метрик отдаётся по токену из настроек."""
+        for token, status in (('secret', HTTPStatus.OK),
+                              ('wrong', HTTPStatus.NOT_FOUND)):
+            with self.subTest(token=token):
+                response = self.client.get('/internal/metrics/',
+                                           HTTP_X_METRICS_TOKEN=token)
+                self.assertEqual(response.status_code, status)
+
+    def test_nested_render_counted_once(self):
+        """Время вложенной отрисовки не прибавляется к внешней второй
+        раз."""
+        engine = engines['metrics']
+        inner = engine.from_string('внутри')
+
+        class Nested:
+            def __str__(self):
+                return inner.render()
+
+        outer = engine.from_string('{{ nested }}')
+        state = threading.local()
+        state.current = RequestMetrics()
+        with mock.patch('core.metrics._state', state), mock.patch(
+                'core.metrics.time.perf_counter',
+                side_effect=itertools.count()):
+            outer.render({'nested': Nested()})
+        # Часы прибавляют 1 на каждый вызов: внешняя отрисовка 0 → 2,
+        # вложенная читает их один раз (1), но ничего не прибавляет
+        self.assertEqual(state.current.template_time, 2)
+
+
+class QueryBudgetTest(TestCase):
+    def setUp(self):
+        @query_budget(1)
+        def view(request):
+            list(User.objects.all())
+            list(User.objects.all())
+            return HttpResponse()
+
+        self.view = view
+        self.request = RequestFactory().get('/')
+
+    @override_settings(QUERY_BUDGET_MODE='raise')
+    def test_budget_exceeded_raises_with_sql(self):
+        """Превышение бюджета вызывает ошибку с текстом запросов."""
+        with self.assertRaisesRegex(QueryBudgetExceeded, 'auth_user'):
+            self.view(self.request)
+
+    @override_settings(QUERY_BUDGET_MODE='log')
+    def test_budget_exceeded_logged(self):
+        """В режиме log превышение пишется в лог."""
+        with self.assertLogs('core.query_budget', 'WARNING'):
+            self.view(self.request)
+
+
+class TemplateCacheTest(TestCase):
+    def templates(self, dirs):
+        templates = copy.deepcopy(settings.TEMPLATES)
+        templates[0]['DIRS'] = dirs
+        templates[0]['APP_DIRS'] = False
+        templates[0]['OPTIONS']['loaders'] = [
+            ('django.template.loaders.cached.Loader', [
+                'django.template.loaders.filesystem.Loader',
+            ]),
+        ]
+        return templates
+
+    def test_precompile_fills_cache(self):
+        """Все шаблоны компилируются при запуске и берутся из памяти."""
+        with override_settings(TEMPLATES=self.templates(
+                [settings.TEMPLATES_DIR])):
+            self.assertGreater(precompile_templates(), 0)
+            loader = engines.all()[0].engine.template_loaders[0]
+            for name in ('base.html', 'posts/includes/post_list.html'):
+                self.assertIn(name, loader.get_template_cache)
+
+    def test_broken_template_fails_fast(self):
+        """Сломанный шаблон находится проверкой и останавливает запуск."""
+        with tempfile.TemporaryDirectory() as directory:
+            Path(directory, 'broken.html').write_text('{% if %}')
+            with override_settings(TEMPLATES=self.templates([directory])):
+                errors = check_templates(None)
+                with self.assertRaises(ImproperlyConfigured):
+                    precompile_templates()
+        self.assertEqual([error.id for error in errors], ['core.E001'])
+        self.assertIn('broken.html', errors[0].msg)
+
+
+class SQLiteCacheTest(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = str(Path(directory.name, 'cache.sqlite3'))
+        self.cache = self.worker(MAX_SIZE=20_000, STATS_FLUSH_INTERVAL=0)
+
+    def worker(self, **options):
+        """Экземпляр кеша так, как его видит отдельный процесс."""
+        return SQLiteCache(self.path, {'OPTIONS': options})
+
+    def test_shared_between_workers(self):
+        """Запись и сброс одного процесса видны другому."""
+        other = self.worker()
+        self.cache.set('page', {'html': 'версия 1'})
+        self.assertEqual(other.get('page'), {'html': 'версия 1'})
+        other.delete('page')
+        self.assertIsNone(self.cache.get('page'))
+        self.cache.set('generation', 1)
+        other.incr('generation')
+        self.assertEqual(self.cache.get('generation'), 2)
+
+    def test_add_and_expiry(self):
+        self.assertTrue(self.cache.add('lock', 1))
+        self.assertFalse(self.worker().add('lock', 2))
+        self.cache.set('old', 1, timeout=0)
+        self.assertIsNone(self.cache.get('old'))
+        self.assertTrue(self.cache.add('old', 3))
+        self.assertEqual(self.cache.get_many(['lock', 'old', 'none']),
+                         {'lock': 1, 'old': 3})
+
+    def test_memory_budget_evicts_least_recently_used(self):
+        """Сверх бюджета вытесняются давно не читанные записи."""
+        self.cache.access_resolution = 0
+        self.cache.set('hot', 'x' * 1000)
+        for number in range(50):
+            self.cache.get('hot')
+            self.cache.set(f'cold_{number}', 'x' * 1000)
+        stats = self.cache.stats()
+        self.assertLessEqual(stats['size'], 20_000)
+        self.assertGreater(stats['evictions'], 0)
+        self.assertEqual(self.cache.get('hot'), 'x' * 1000)
+        self.assertIsNone(self.cache.get('cold_0'))
+        self.assertEqual(stats['hits'], 50)
+
+
+@mock.patch('core.object_cache.in_transaction', return_value=False)
+class ObjectCacheTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        object_cache.local_cache.clear()
+        self.user = User.objects.create_user(username='reader')
+
+    def test_second_lookup_without_queries(self, in_transaction):
+        object_cache.get_object(User, username='reader')
+        with self.assertNumQueries(0):
+            user = object_cache.get_object(User, username='reader')
+        self.assertEqual(user, self.user)
+
+    def test_shared_cache_without_local(self, in_transaction):
+        """Другой процесс с пустым первым уровнем читает второй."""
+        object_cache.get_object(User, username='reader')
+        object_cache.local_cache.clear()
+        with self.assertNumQueries(0):
+            object_cache.get_object(User, username='reader')
+
+    def test_save_invalidates(self, in_transaction):
+        object_cache.get_object(User, username='reader')
+        self.user.first_name = 'Новое имя'
+        self.user.save()
+        user = object_cache.get_object(User, username='reader')
+        self.assertEqual(user.first_name, 'Новое имя')
+
+    def test_ignored_fields_keep_cache(self, in_transaction):
+        object_cache.get_object(User, username='reader')
+        self.user.save(update_fields=['last_login'])
+        with self.assertNumQueries(0):
+            object_cache.get_object(User, username='reader')
+
+    def test_only_listed_fields_cached(self, in_transaction):
+        """В кеш не попадают пароль и почта пользователя."""
+        self.user.email = 'reader@example.com'
+        self.user.set_password('secret')
+        self.user.save()
+        object_cache.get_object(User, username='reader')
+        key = object_cache.object_key('auth.user', {'username': 'reader'})
+        _, shared = cache.get(key)
+        local = pickle.loads(object_cache.local_cache.get(key))
+        for user in (shared, local):
+            self.assertLessEqual({'password', 'email'},
+                                 user.get_deferred_fields())
+            self.assertNotIn(self.user.password, str(pickle.dumps(user)))
+
+    def test_missing_object(self, in_transaction):
+        with self.assertRaises(Http404):
+            object_cache.get_object_or_404(User, username='nobody')
+
+    def test_transaction_bypasses_cache(self, in_transaction):
+        in_transaction.return_value = True
+        object_cache.get_object(User, username='reader')
+        with self.assertNumQueries(1):
+            object_cache.get_object(User, username='reader')
+
+
+class PurgeStub(BaseHTTPRequestHandler):
+    """Прокси-заглушка: складывает ключи запросов сброса в очередь."""
+
+    def do_POST(self):
+        self.server.purged.put(self.headers['Surrogate-Key'])
+        self.send_response(200)
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+class SurrogateTest(TestCase):
+    def setUp(self):
+        server = HTTPServer(('127.0.0.1', 0), PurgeStub)
+        server.purged = queue.Queue()
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        self.purged = server.purged
+        self.url = f'http://127.0.0.1:{server.server_port}/purge'
+
+    def test_keys_batched(self):
+        """Ключи, пришедшие за время ожидания, уходят пачками."""
+        dispatcher = PurgeDispatcher()
+        with override_settings(SURROGATE_PURGE_URL=self.url,
+                               SURROGATE_PURGE_DELAY=0.1,
+                               SURROGATE_PURGE_BATCH=2):
+            dispatcher.add(['post:1', 'user:1'])
+            dispatcher.add(['post:1', 'index'])
+            batches = [self.purged.get(timeout=5) for _ in range(2)]
+        self.assertEqual(batches, ['index post:1', 'user:1'])
+        self.assertTrue(self.purged.empty())
+
+    def test_page_keys_header(self):
+        """Страница перечисляет в заголовке объекты, которые показывает."""
+        cache.clear()
+        user = User.objects.create_user(username='author')
+        response = self.client.get(f'/profile/{user.username}/')
+        self.assertEqual(response['Surrogate-Key'], f'user:{user.pk}')
+
+    @override_settings(SURROGATE_PURGE_URL='http://proxy/purge')
+    def test_write_purges_after_commit(self):
+        user = User.objects.create_user(username='author')
+        with mock.patch('django.db.transaction.on_commit',
+                        side_effect=lambda func: func()), \
+                mock.patch('core.surrogate.dispatcher.add') as add:
+            Post.objects.create(text='Пост', author=user)
+        keys = {key for call in add.call_args_list for key in call[0][0]}
+        self.assertIn('index', keys)
+        self.assertIn(f'user:{user.pk}', keys)
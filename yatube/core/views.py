@@ -1,5 +1,12 @@
+import hmac
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import Http404, JsonResponse
 from django.shortcuts import render
 
+from core.metrics import metrics_snapshot
+
 
 def csrf_failure(request, reason=''):
     return render(request, 'core/403csrf.html')
@@ -15,3 +22,25 @@ def server_error(request):
 
 def permission_denied(request, exception):
     return render(request, 'core/403.html', status=403)
+
+
+def metrics(request):
+    """Гистограммы метрик по представлениям для сотрудников и клиентов с
+    токеном METRICS_TOKEN в заголовке X-Metrics-Token, а также
+    статистика кеша, если бэкенд её ведёт.
+
+    Адрес клиента не проверяется: за кеширующим прокси все запросы
+    приходят с его адреса.
+    """
+    if not (request.user.is_staff or has_metrics_token(request)):
+        raise Http404
+    snapshot = metrics_snapshot()
+    if hasattr(cache, 'stats'):
+        snapshot['cache'] = cache.stats()
+    return JsonResponse(snapshot, json_dumps_params={'ensure_ascii': False})
+
+
+def has_metrics_token(request):
+    token = request.META.get('HTTP_X_METRICS_TOKEN')
+    return bool(settings.METRICS_TOKEN and token) and hmac.compare_digest(
+        token, settings.METRICS_TOKEN)
@@ -1,6 +1,7 @@
 from django.contrib import admin
 
 from .models import Post, Group, Comment
+from .search import build_match
 
 
 class PostAdmin(admin.ModelAdmin):
@@ -11,15 +12,30 @@ class PostAdmin(admin.ModelAdmin):
         'author',
         'group',
         'image',
+        'comment_count',
+        'last_comment_at',
     )
     list_editable = ('group',)
+    # Поля ведёт posts.comment_counts, см. Post.save
+    readonly_fields = Post.COMMENT_FIELDS
     search_fields = ('text',)
     list_filter = ('created',)
     empty_value_display = '-пусто-'
 
+    def get_queryset(self, request):
+        return super().get_queryset(request).for_list()
+
+    def get_search_results(self, request, queryset, search_term):
+        """Поиск по полнотекстовому индексу вместо LIKE по text."""
+        match = build_match(search_term)
+        if match is None:
+            return queryset, False
+        return queryset.filter(search_index__text__match=match), False
+
 
 class CommentAdmin(admin.ModelAdmin):
     list_display = ("text", "author", "post")
+    list_select_related = ("author", "post")
     search_fields = ("text",)
     empty_value_display = "-пусто-"
 
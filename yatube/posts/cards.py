@@ -0,0 +1,91 @@
+"""Кеш отрисованных карточек постов в списках.
+
+Карточка хранится вместе с версиями поста, автора, группы и картинки,
+из которых она собрана. Изменение любого из них выдаёт новую версию
+(см. bump_version), и карточка перерисовывается при следующем показе.
+Версия — случайная строка, а не счётчик, поэтому вытеснение ключа
+версии из кеша тоже делает старые карточки недействительными.
+
+Страница списка читает карточки и версии всех своих постов одним
+get_many и отрисовывает только промахи.
+"""
+import hashlib
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+from django.template.loader import render_to_string
+
+from core.replicas import cap_timeout
+
+CARD_TEMPLATE = 'posts/includes/post_list.html'
+
+
+def version_key(kind, ident):
+    return f'card:version:{kind}:{ident}'
+
+
+def image_version_key(image_name):
+    return version_key('image', hashlib.md5(image_name.encode()).hexdigest())
+
+
+def bump_version(key):
+    """Делает недействительными карточки, собранные с версией key."""
+    cache.set(key, uuid.uuid4().hex, None)
+
+
+def card_key(post, with_group):
+    return f'card:{post.pk}:{int(with_group)}'
+
+
+def get_version_keys(post):
+    keys = [
+        version_key('post', post.pk),
+        version_key('user', post.author_id),
+    ]
+    if post.group_id is not None:
+        keys.append(version_key('group', post.group_id))
+    if post.image:
+        keys.append(image_version_key(post.image.name))
+    return keys
+
+
+def get_version(key, cached):
+    """Текущая версия key; отсутствующая версия создаётся."""
+    if key not in cached:
+        cache.add(key, uuid.uuid4().hex, None)
+        cached[key] = cache.get(key)
+    return cached[key]
+
+
+def render_cards(posts, with_group=True):
+    """HTML карточек постов в порядке posts.
+
+    with_group добавляет под карточкой ссылку на группу поста.
+    """
+    posts = list(posts)
+    version_keys = {post.pk: get_version_keys(post) for post in posts}
+    keys = {key for keys in version_keys.values() for key in keys}
+    keys.update(card_key(post, with_group) for post in posts)
+    cached = cache.get_many(keys)
+    cards = []
+    missed = {}
+    for post in posts:
+        versions = [get_version(key, cached) for key in version_keys[post.pk]]
+        key = card_key(post, with_group)
+        entry = cached.get(key)
+        if entry is not None and entry[0] == versions:
+            cards.append(entry[1])
+            continue
+        html = render_to_string(
+            CARD_TEMPLATE, {'post': post, 'with_group': with_group})
+        missed[key] = (versions, html)
+        cards.append(html)
+    if missed:
+        store_cards(missed)
+    return cards
+
+
+def store_cards(cards):
+    # Карточка, собранная из реплики, может отставать от своей версии
+    cache.set_many(cards, cap_timeout(settings.CARD_CACHE_TIMEOUT))
@@ -0,0 +1,83 @@
+"""Денормализованные Post.comment_count и Post.last_comment_at.
+
+Поля меняются одним UPDATE с F-выражениями при сохранении и удалении
+комментария (см. signals), поэтому одновременные комментарии к одному
+посту не теряют приращений. Комментарии, созданные в обход сигналов
+(bulk_create, загрузка данных), поля не меняют; такие расхождения
+исправляет reconcile_all (команда reconcile_comment_counts).
+"""
+from datetime import datetime, timezone
+
+from django.db import transaction
+from django.db.models import (
+    Count, DateTimeField, F, IntegerField, Max, OuterRef, Subquery, Value
+)
+from django.db.models.functions import Coalesce, Greatest
+
+from .models import Comment, Post
+
+NEVER = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+
+def comment_added(comment):
+    created = Value(comment.created, output_field=DateTimeField())
+    Post.objects.filter(pk=comment.post_id).update(
+        comment_count=F('comment_count') + 1,
+        last_comment_at=Greatest(
+            Coalesce('last_comment_at', created), created),
+    )
+
+
+def comment_removed(comment):
+    Post.objects.filter(pk=comment.post_id, comment_count__gt=0).update(
+        comment_count=F('comment_count') - 1,
+        last_comment_at=last_comment_subquery(),
+    )
+
+
+def count_subquery():
+    return Coalesce(Subquery(
+        Comment.objects.filter(post=OuterRef('pk')).order_by().values(
+            'post'
+        ).annotate(total=Count('pk')).values('total'),
+        output_field=IntegerField(),
+    ), 0)
+
+
+def last_comment_subquery():
+    return Subquery(Comment.objects.filter(
+        post=OuterRef('pk')
+    ).order_by('-created').values('created')[:1])
+
+
+def reconcile(start, stop):
+    """Пересчитывает поля постов с id из [start, stop); возвращает
+    число исправленных постов."""
+    # NULL (комментариев нет) заменяется датой, которая не встречается,
+    # чтобы сравнение было однозначным
+    never = Value(NEVER, output_field=DateTimeField())
+    drifted = Post.objects.filter(pk__gte=start, pk__lt=stop).annotate(
+        actual_count=count_subquery(),
+        stored_last=Coalesce('last_comment_at', never),
+        actual_last=Coalesce(last_comment_subquery(), never),
+    ).exclude(
+        comment_count=F('actual_count'), stored_last=F('actual_last'),
+    ).values_list('pk', flat=True)
+    ids = list(drifted)
+    if ids:
+        Post.objects.filter(pk__in=ids).update(
+            comment_count=count_subquery(),
+            last_comment_at=last_comment_subquery(),
+        )
+    return len(ids)
+
+
+def reconcile_all(batch_size=5000):
+    """Сверяет все посты диапазонами id по batch_size, каждый диапазон
+    в своей транзакции; возвращает число исправленных постов."""
+    last_id = Post.objects.aggregate(last_id=Max('pk'))['last_id'] or 0
+    fixed = 0
+    for start in range(1, last_id + 1, batch_size):
+        with transaction.atomic():
+            fixed += reconcile(start, start + batch_size)
+    return fixed
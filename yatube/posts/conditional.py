@@ -0,0 +1,111 @@
+"""Валидаторы ETag и Last-Modified для условных GET-запросов.
+
+Состояние страницы читается одним запросом: последние даты изменения
+постов (по индексам) и комментариев (Post.last_comment_at), счётчики
+постов из posts.counters, число комментариев и поля, которые страница
+выводит. В ETag кроме него входят пользователь, его cookie CSRF (форма
+на странице содержит токен) и поколение кеша страниц. Поколение
+меняется при подписках и после построения миниатюр, то есть при
+изменениях, которые не видны по датам и счётчикам.
+"""
+import hashlib
+
+from django.conf import settings
+from django.db.models import OuterRef, Subquery
+from django.views.decorators.http import condition
+
+from core.page_cache import get_generation
+
+from . import counters
+from .models import Group, Post, User
+
+
+def conditional_page(get_state):
+    """condition, где ETag и Last-Modified вычисляются одним вызовом
+    get_state(request, *args, **kwargs) на запрос.
+
+    get_state возвращает время последнего изменения и кортеж значений,
+    описывающих страницу, или None, если объекта нет.
+    """
+    def get_validators(request, *args, **kwargs):
+        if not hasattr(request, 'validators'):
+            state = get_state(request, *args, **kwargs)
+            request.validators = (None, None)
+            if state is not None:
+                last_modified, values = state
+                request.validators = (make_etag(request, values),
+                                      last_modified)
+        return request.validators
+
+    return condition(
+        etag_func=lambda *args, **kwargs: get_validators(*args, **kwargs)[0],
+        last_modified_func=(
+            lambda *args, **kwargs: get_validators(*args, **kwargs)[1]),
+    )
+
+
+def make_etag(request, values):
+    user = request.user.pk if request.user.is_authenticated else 'anon'
+    key = repr((
+        user,
+        request.COOKIES.get(settings.CSRF_COOKIE_NAME),
+        get_generation(),
+        values,
+    ))
+    return hashlib.md5(key.encode()).hexdigest()
+
+
+def first_row(queryset):
+    # Без сортировки: строка одна, ORDER BY только мешает плану
+    return next(iter(queryset.order_by()[:1]), None)
+
+
+def latest_value(queryset, field):
+    """Подзапрос с наибольшим значением field; по индексу это один
+    переход, в отличие от Max, который читает все строки."""
+    return Subquery(queryset.order_by(f'-{field}').values(field)[:1])
+
+
+def latest(*moments):
+    moments = [moment for moment in moments if moment is not None]
+    return max(moments) if moments else None
+
+
+def post_detail_state(request, post_id):
+    row = first_row(Post.objects.filter(pk=post_id).annotate(
+        posts_count=counters.value_subquery(
+            counters.AUTHOR_PREFIX, 'author_id'),
+    ).values_list(
+        'updated', 'last_comment_at', 'comment_count', 'posts_count',
+        'author__first_name', 'author__last_name', 'group__slug',
+        'group__title',
+    ))
+    if row is None:
+        return None
+    return latest(row[0], row[1]), row
+
+
+def profile_state(request, username):
+    row = first_row(User.objects.filter(username=username).annotate(
+        last_post=latest_value(
+            Post.objects.filter(author=OuterRef('pk')), 'updated'),
+        posts_count=counters.value_subquery(counters.AUTHOR_PREFIX, 'pk'),
+    ).values_list(
+        'last_post', 'posts_count', 'first_name', 'last_name',
+    ))
+    if row is None:
+        return None
+    return row[0], row
+
+
+def group_state(request, slug):
+    row = first_row(Group.objects.filter(slug=slug).annotate(
+        last_post=latest_value(
+            Post.objects.filter(group=OuterRef('pk')), 'updated'),
+        posts_count=counters.value_subquery(counters.GROUP_PREFIX, 'pk'),
+    ).values_list(
+        'last_post', 'posts_count', 'title', 'description',
+    ))
+    if row is None:
+        return None
+    return row[0], row
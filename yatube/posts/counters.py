@@ -0,0 +1,124 @@
+"""Счётчики постов, которые заменяют COUNT(*) в списках.
+
+Счётчик заводится при первом чтении (значение берётся из COUNT) и дальше
+меняется сигналами сохранения и удаления постов через F-выражения.
+Счётчик ленты подписок приблизительный: он кешируется на
+FEED_COUNT_TIMEOUT секунд.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, router, transaction
+from django.db.models import CharField, F, OuterRef, Subquery, Value
+from django.db.models.functions import Cast, Concat
+
+from .models import Counter, Post
+
+ALL_POSTS = 'posts'
+AUTHOR_PREFIX = 'posts:author:'
+GROUP_PREFIX = 'posts:group:'
+
+
+def author_key(author_id):
+    return f'{AUTHOR_PREFIX}{author_id}'
+
+
+def group_key(group_id):
+    return f'{GROUP_PREFIX}{group_id}'
+
+
+def feed_key(user_id):
+    return f'feed_count:{user_id}'
+
+
+def post_keys(author_id, group_id):
+    keys = [ALL_POSTS, author_key(author_id)]
+    if group_id is not None:
+        keys.append(group_key(group_id))
+    return keys
+
+
+def get_count(name, queryset):
+    """Значение счётчика name; при первом обращении считает queryset.
+
+    Счётчики читаются из основной базы и в представлениях с репликами:
+    по отстающей реплике счётчик завёлся бы заново с устаревшим COUNT,
+    а сигналы потом только сдвигают его.
+    """
+    db = router.db_for_write(Counter)
+    value = Counter.objects.using(db).filter(
+        name=name
+    ).values_list('value', flat=True).first()
+    if value is None:
+        value = seed(name, queryset.using(db), db)
+    return value
+
+
+def seed(name, queryset, db):
+    """Заводит в базе db счётчик name со значением COUNT(queryset).
+
+    Пост, созданный между подсчётом и вставкой счётчика, не сдвинул бы
+    его, поэтому queryset считается уже после вставки, в той же
+    транзакции: до её фиксации другие записи ждут, а после неё посты
+    меняют заведённый счётчик сигналами.
+    """
+    counters = Counter.objects.using(db)
+    with transaction.atomic(using=db):
+        try:
+            with transaction.atomic(using=db):
+                counter = counters.create(name=name)
+        except IntegrityError:
+            # Счётчик уже завёл параллельный запрос
+            return counters.get(name=name).value
+        counter.value = queryset.count()
+        counter.save(update_fields=['value'])
+    return counter.value
+
+
+def value_subquery(prefix, outer_field):
+    """Подзапрос со значением счётчика prefix + outer_field внешнего
+    запроса; None, если счётчик ещё не заведён."""
+    name = Concat(
+        Value(prefix), Cast(OuterRef(outer_field), CharField()),
+        output_field=CharField(),
+    )
+    return Subquery(
+        Counter.objects.filter(name=name).values('value')[:1])
+
+
+def change(names, delta):
+    """Сдвигает существующие счётчики names на delta."""
+    Counter.objects.filter(
+        name__in=names
+    ).update(value=F('value') + delta)
+
+
+def posts_count():
+    return get_count(ALL_POSTS, Post.objects.all())
+
+
+def author_posts_count(author):
+    return get_count(author_key(author.pk), author.posts.all())
+
+
+def group_posts_count(group):
+    return get_count(group_key(group.pk), group.grouped_posts.all())
+
+
+def feed_count(user, feed):
+    """Приблизительное число постов в ленте подписок."""
+    return cache.get_or_set(
+        feed_key(user.pk), feed.count, settings.FEED_COUNT_TIMEOUT
+    )
+
+
+def reset_feed_count(user_id):
+    cache.delete(feed_key(user_id))
+
+
+def reset_group(group_id):
+    Counter.objects.filter(name=group_key(group_id)).delete()
+
+
+def reset():
+    """Сбрасывает счётчики: они будут пересчитаны при следующем чтении."""
+    Counter.objects.filter(name__startswith=ALL_POSTS).delete()
@@ -1,6 +1,6 @@
 from django import forms
 from django.utils.translation import gettext_lazy as _
-from .models import Post, Comment
+from .models import Comment, Group, Post
 
 
 class PostForm(forms.ModelForm):
@@ -35,3 +35,24 @@ class CommentForm(forms.ModelForm):
                        'class': "form-control",
                        'required id': "id_text"}),
         }
+
+
+class SearchForm(forms.Form):
+    q = forms.CharField(
+        label=_('Найти'),
+        max_length=200,
+        widget=forms.TextInput(attrs={'class': "form-control"}),
+    )
+    group = forms.ModelChoiceField(
+        label=_('Группа'),
+        queryset=Group.objects.all(),
+        to_field_name='slug',
+        required=False,
+        widget=forms.Select(attrs={'class': "form-control"}),
+    )
+    author = forms.CharField(
+        label=_('Автор'),
+        max_length=150,
+        required=False,
+        widget=forms.TextInput(attrs={'class': "form-control"}),
+    )
@@ -0,0 +1,105 @@
+import re
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts.models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+# Шаги плана SQLite: полный проход по таблице и сортировка во временном
+# B-дереве. Проход по индексу (SCAN ... USING INDEX) допустим.
+BAD_STEP = re.compile(
+    r'^(SCAN (?!CONSTANT ROW)(?!.* USING (COVERING )?INDEX )'
+    r'|USE TEMP B-TREE)'
+)
+# Таблицы, которые читаются целиком намеренно: форма поста выводит
+# все группы в выпадающем списке.
+FULL_SCAN_ALLOWED = {'posts_group'}
+
+
+class Command(BaseCommand):
+    help = (
+        'Выполняет EXPLAIN QUERY PLAN для запросов каждой страницы постов '
+        'и завершается ошибкой, если какой-то запрос проходит таблицу '
+        'целиком или сортирует во временном B-дереве. Тестовые данные '
+        'создаются внутри транзакции и откатываются.'
+    )
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            problems = self.run()
+            transaction.set_rollback(True)
+        if problems:
+            raise CommandError(
+                f'Запросов с плохим планом: {len(problems)}')
+        self.stdout.write(self.style.SUCCESS('Все планы используют индексы'))
+
+    def run(self):
+        author = User.objects.create_user(username='audit_author')
+        followed = User.objects.create_user(username='audit_followed')
+        group = Group.objects.create(
+            title='Аудит', slug='audit-plans', description='Аудит')
+        for user in (author, followed):
+            for number in range(3):
+                Post.objects.create(
+                    text=f'Пост {number}', author=user, group=group)
+        post = Post.objects.filter(author=author).first()
+        Comment.objects.create(post=post, author=followed, text='Комментарий')
+        Follow.objects.create(user=author, author=followed)
+        client = Client(HTTP_HOST='localhost')
+        client.force_login(author)
+        problems = []
+        for name, kwargs, params in self.get_pages(author, group, post):
+            url = reverse(name, kwargs=kwargs)
+            with CaptureQueriesContext(connection) as queries:
+                response = client.get(url, params)
+            if response.status_code != 200:
+                raise CommandError(
+                    f'{url} вернул {response.status_code}')
+            for query in queries.captured_queries:
+                steps = self.explain(query['sql'])
+                bad = [step for step in steps if self.is_bad(step)]
+                if bad:
+                    problems.append(query['sql'])
+                    self.stdout.write(self.style.ERROR(f'{url}: '))
+                    self.stdout.write(f'  {query["sql"]}')
+                    for step in bad:
+                        self.stdout.write(f'    {step}')
+        return problems
+
+    @staticmethod
+    def get_pages(author, group, post):
+        """Страницы приложения: имя URL, аргументы и GET-параметры."""
+        return [
+            ('posts:index', {}, {}),
+            ('posts:index', {}, {'page': 2}),
+            ('posts:index', {}, {'cursor': ''}),
+            ('posts:group_list', {'slug': group.slug}, {}),
+            ('posts:profile', {'username': author.username}, {}),
+            ('posts:post_detail', {'post_id': post.id}, {}),
+            ('posts:post_detail', {'post_id': post.id}, {'order': 'new'}),
+            ('posts:post_comments', {'post_id': post.id}, {}),
+            ('posts:post_edit', {'post_id': post.id}, {}),
+            ('posts:post_create', {}, {}),
+            ('posts:follow_index', {}, {}),
+        ]
+
+    @staticmethod
+    def is_bad(step):
+        if not BAD_STEP.match(step):
+            return False
+        operation, table = step.split()[:2]
+        return not (operation == 'SCAN' and table in FULL_SCAN_ALLOWED)
+
+    @staticmethod
+    def explain(sql):
+        if not sql.lstrip().upper().startswith('SELECT'):
+            return []
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+            return [row[-1] for row in cursor.fetchall()]
@@ -0,0 +1,97 @@
+import statistics
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test import RequestFactory
+
+from posts.models import Follow, Post, Timeline
+from posts.timeline import add_author, get_feed
+from posts.utils import get_page_context
+
+User = get_user_model()
+
+CHUNK_SIZE = 5000
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает время чтения страницы подписок через соединение '
+        'Post с Follow и через материализованную ленту. Тестовые данные '
+        'создаются внутри транзакции и откатываются после замеров.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sizes', nargs='+', type=int,
+            default=[10_000, 100_000, 1_000_000],
+            help='Количество постов в таблице для каждого замера.',
+        )
+        parser.add_argument('--authors', type=int, default=100)
+        parser.add_argument(
+            '--following', type=int, default=20,
+            help='На скольких авторов подписан читатель.',
+        )
+        parser.add_argument('--repeat', type=int, default=20)
+        parser.add_argument('--page', type=int, default=1)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            self.run(**options)
+            transaction.set_rollback(True)
+
+    def run(self, sizes, authors, following, repeat, page, **options):
+        reader = User.objects.create_user(username='bench_reader')
+        User.objects.bulk_create(
+            User(username=f'bench_author_{i}') for i in range(authors)
+        )
+        author_ids = list(User.objects.filter(
+            username__startswith='bench_author_'
+        ).values_list('id', flat=True))
+        followed = author_ids[:following]
+        Follow.objects.bulk_create(
+            Follow(user=reader, author_id=author_id)
+            for author_id in followed
+        )
+        request = RequestFactory().get('/follow/', {'page': page})
+        join_feed = Post.objects.select_related(
+            'author', 'group'
+        ).filter(author__following__user=reader)
+
+        self.stdout.write(
+            f'{"posts":>10} {"join, ms":>10} {"timeline, ms":>13} '
+            f'{"speedup":>8}'
+        )
+        total = 0
+        for size in sorted(sizes):
+            self.create_posts(author_ids, total, size)
+            total = size
+            Timeline.objects.filter(user=reader).delete()
+            for author_id in followed:
+                add_author(reader.id, author_id)
+            join_ms = self.measure(join_feed, request, repeat)
+            timeline_ms = self.measure(get_feed(reader), request, repeat)
+            self.stdout.write(
+                f'{size:>10} {join_ms:>10.2f} {timeline_ms:>13.2f} '
+                f'{join_ms / timeline_ms:>7.1f}x'
+            )
+
+    @staticmethod
+    def create_posts(author_ids, start, stop):
+        for chunk in range(start, stop, CHUNK_SIZE):
+            Post.objects.bulk_create(
+                Post(text=f'Пост {number}',
+                     author_id=author_ids[number % len(author_ids)])
+                for number in range(chunk, min(chunk + CHUNK_SIZE, stop))
+            )
+
+    @staticmethod
+    def measure(queryset, request, repeat):
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            page_obj = get_page_context(queryset, request)
+            list(page_obj.object_list)
+            timings.append((time.perf_counter() - start) * 1000)
+        return statistics.median(timings)
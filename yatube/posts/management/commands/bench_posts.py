@@ -0,0 +1,147 @@
+import random
+import statistics
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Count, Max
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import reverse
+
+from posts.models import Comment, Group, Post
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = (
+        'Прогоняет страницы приложения posts через тестовый клиент и '
+        'выводит перцентили задержки и число SQL-запросов на запрос. '
+        'Данные удобно создать командой generate_social_graph. Посты и '
+        'комментарии, созданные во время замера, потом удаляются.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--requests', type=int, default=50,
+            help='Сколько запросов выполнить в каждом сценарии.',
+        )
+        parser.add_argument(
+            '--pages', type=int, default=5,
+            help='Номера страниц главной выбираются из 1..pages.',
+        )
+        parser.add_argument(
+            '--username',
+            help='Читатель; по умолчанию пользователь с наибольшим '
+                 'числом подписок.',
+        )
+        parser.add_argument(
+            '--cold', action='store_true',
+            help='Очищать кеш перед каждым запросом.',
+        )
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        self.random = random.Random(options['seed'])
+        self.options = options
+        # Замер идёт вне транзакции, иначе кеш объектов не работал бы.
+        # Число запросов он показывает сам, бюджеты ему не мешают
+        last_post = Post.objects.aggregate(last=Max('pk'))['last'] or 0
+        last_comment = Comment.objects.aggregate(
+            last=Max('pk'))['last'] or 0
+        try:
+            with override_settings(QUERY_BUDGET_MODE='off'):
+                self.run()
+        finally:
+            # QuerySet.delete шлёт post_delete для каждого объекта, так что
+            # сигналы вернут счётчики и сбросят кеши
+            Comment.objects.filter(pk__gt=last_comment).delete()
+            Post.objects.filter(pk__gt=last_post).delete()
+
+    def run(self):
+        reader = self.get_reader()
+        self.post_ids = list(Post.objects.values_list('id', flat=True))
+        self.usernames = list(User.objects.filter(
+            posts__isnull=False
+        ).distinct().values_list('username', flat=True))
+        self.slugs = list(Group.objects.values_list('slug', flat=True))
+        if not (self.post_ids and self.slugs):
+            raise CommandError('Нет постов или групп: запустите '
+                               'generate_social_graph')
+        # Адрес не из INTERNAL_IPS, чтобы не включалась debug_toolbar
+        self.client = Client(HTTP_HOST='localhost', REMOTE_ADDR='10.0.0.1')
+        self.client.force_login(reader)
+        self.stdout.write(
+            f'Читатель {reader.username}, постов {len(self.post_ids)}')
+        self.stdout.write(
+            f'{"scenario":>14} {"n":>5} {"p50, ms":>9} {"p95, ms":>9} '
+            f'{"p99, ms":>9} {"queries":>8} {"max q":>6}'
+        )
+        for name, make_request in self.get_scenarios():
+            self.report(name, self.measure(make_request))
+
+    def get_reader(self):
+        username = self.options['username']
+        if username:
+            return User.objects.get(username=username)
+        reader = User.objects.annotate(
+            following_count=Count('follower')
+        ).order_by('-following_count').first()
+        if reader is None:
+            raise CommandError('Нет пользователей')
+        return reader
+
+    def get_scenarios(self):
+        choice = self.random.choice
+        pages = self.options['pages']
+        return [
+            ('index', lambda: self.client.get(
+                reverse('posts:index'),
+                {'page': self.random.randint(1, pages)})),
+            ('profile', lambda: self.client.get(reverse(
+                'posts:profile', args=[choice(self.usernames)]))),
+            ('group_list', lambda: self.client.get(reverse(
+                'posts:group_list', args=[choice(self.slugs)]))),
+            ('follow_index', lambda: self.client.get(
+                reverse('posts:follow_index'))),
+            ('post_detail', lambda: self.client.get(reverse(
+                'posts:post_detail', args=[choice(self.post_ids)]))),
+            ('post_create', lambda: self.client.post(
+                reverse('posts:post_create'), {'text': 'Замер'})),
+            ('add_comment', lambda: self.client.post(reverse(
+                'posts:add_comment', args=[choice(self.post_ids)]),
+                {'text': 'Замер'})),
+        ]
+
+    def measure(self, make_request):
+        timings = []
+        queries = []
+        for _ in range(self.options['requests']):
+            if self.options['cold']:
+                cache.clear()
+            with CaptureQueriesContext(connection) as captured:
+                start = time.perf_counter()
+                response = make_request()
+                timings.append((time.perf_counter() - start) * 1000)
+            if response.status_code >= 400:
+                raise CommandError(
+                    f'{response.request["PATH_INFO"]} вернул '
+                    f'{response.status_code}')
+            queries.append(len(captured))
+        return timings, queries
+
+    def report(self, name, result):
+        timings, queries = result
+        if len(timings) > 1:
+            cuts = statistics.quantiles(timings, n=100)
+            p50, p95, p99 = cuts[49], cuts[94], cuts[98]
+        else:
+            p50 = p95 = p99 = timings[0]
+        self.stdout.write(
+            f'{name:>14} {len(timings):>5} {p50:>9.1f} {p95:>9.1f} '
+            f'{p99:>9.1f} {statistics.mean(queries):>8.1f} '
+            f'{max(queries):>6}'
+        )
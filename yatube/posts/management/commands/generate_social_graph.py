@@ -0,0 +1,195 @@
+import io
+import random
+from itertools import accumulate
+
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from faker import Faker
+from PIL import Image
+
+from core.page_cache import bump_generation
+from posts import counters
+from posts.comment_counts import reconcile_all
+from posts.models import Comment, Follow, Group, Post
+from posts.timeline import rebuild_timelines
+
+User = get_user_model()
+
+CHUNK_SIZE = 5000
+IMAGE_SIZE = (1200, 800)
+
+
+class Command(BaseCommand):
+    help = (
+        'Создаёт синтетический социальный граф для нагрузочных замеров: '
+        'пользователей, подписки со степенным распределением популярности '
+        'авторов, группы, посты с картинками и комментарии. Ленты '
+        'подписок, счётчики и число комментариев постов пересобираются '
+        'после вставки.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--posts', type=int, default=20_000)
+        parser.add_argument('--groups', type=int, default=20)
+        parser.add_argument(
+            '--following', type=int, default=30,
+            help='Среднее число подписок пользователя.',
+        )
+        parser.add_argument(
+            '--alpha', type=float, default=1.2,
+            help='Показатель степенного закона популярности авторов.',
+        )
+        parser.add_argument(
+            '--comments', type=float, default=2,
+            help='Среднее число комментариев к посту.',
+        )
+        parser.add_argument(
+            '--image-share', type=float, default=0.3,
+            help='Доля постов с картинкой.',
+        )
+        parser.add_argument(
+            '--images', type=int, default=20,
+            help='Сколько разных файлов картинок создать.',
+        )
+        parser.add_argument('--prefix', default='bench')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument(
+            '--clear', action='store_true',
+            help='Удалить данные, созданные раньше с тем же префиксом.',
+        )
+
+    def handle(self, *args, **options):
+        self.random = random.Random(options['seed'])
+        self.fake = Faker('ru_RU')
+        self.fake.seed_instance(options['seed'])
+        prefix = options['prefix']
+        with transaction.atomic():
+            if options['clear']:
+                User.objects.filter(username__startswith=f'{prefix}_').delete()
+                Group.objects.filter(slug__startswith=f'{prefix}-').delete()
+            user_ids = self.create_users(prefix, options['users'])
+            group_ids = self.create_groups(prefix, options['groups'])
+            weights = self.popularity(len(user_ids), options['alpha'])
+            follows = self.create_follows(user_ids, weights,
+                                          options['following'])
+            images = self.create_images(prefix, options['images'])
+            self.create_posts(user_ids, weights, group_ids, images,
+                              options['posts'], options['image_share'])
+            post_ids = list(Post.objects.filter(
+                author__username__startswith=f'{prefix}_'
+            ).values_list('id', flat=True))
+            comments = self.create_comments(user_ids, post_ids,
+                                            options['comments'])
+        timeline = rebuild_timelines()
+        counters.reset()
+        # Комментарии вставлены bulk_create, мимо сигналов
+        reconcile_all()
+        bump_generation()
+        self.stdout.write(self.style.SUCCESS(
+            f'Создано: пользователей {len(user_ids)}, групп '
+            f'{len(group_ids)}, подписок {follows}, постов {len(post_ids)}, '
+            f'комментариев {comments}, записей лент {timeline}'
+        ))
+
+    @staticmethod
+    def popularity(size, alpha):
+        """Накопленные веса авторов по закону Ципфа: вес k-го автора
+        пропорционален 1 / k ** alpha."""
+        return list(accumulate(
+            1 / rank ** alpha for rank in range(1, size + 1)))
+
+    def create_users(self, prefix, total):
+        for start in range(0, total, CHUNK_SIZE):
+            User.objects.bulk_create(
+                User(
+                    username=f'{prefix}_{number}',
+                    first_name=self.fake.first_name(),
+                    last_name=self.fake.last_name(),
+                )
+                for number in range(start, min(start + CHUNK_SIZE, total))
+            )
+        return list(User.objects.filter(
+            username__startswith=f'{prefix}_'
+        ).order_by('id').values_list('id', flat=True))
+
+    def create_groups(self, prefix, total):
+        Group.objects.bulk_create(
+            Group(
+                title=self.fake.catch_phrase(),
+                slug=f'{prefix}-{number}',
+                description=self.fake.paragraph(),
+            )
+            for number in range(total)
+        )
+        return list(Group.objects.filter(
+            slug__startswith=f'{prefix}-'
+        ).values_list('id', flat=True))
+
+    def create_follows(self, user_ids, weights, following):
+        """Каждый пользователь подписывается на случайное число авторов,
+        выбранных пропорционально популярности."""
+        total = 0
+        batch = []
+        for user_id in user_ids:
+            count = min(int(self.random.expovariate(1 / following)) + 1,
+                        len(user_ids) - 1)
+            authors = set(self.random.choices(
+                user_ids, cum_weights=weights, k=count))
+            authors.discard(user_id)
+            batch.extend(Follow(user_id=user_id, author_id=author_id)
+                         for author_id in authors)
+            if len(batch) >= CHUNK_SIZE:
+                total += len(batch)
+                Follow.objects.bulk_create(batch)
+                batch = []
+        Follow.objects.bulk_create(batch)
+        return total + len(batch)
+
+    def create_images(self, prefix, total):
+        names = []
+        for number in range(total):
+            color = tuple(self.random.randrange(256) for _ in range(3))
+            buffer = io.BytesIO()
+            Image.new('RGB', IMAGE_SIZE, color).save(buffer, 'JPEG')
+            names.append(default_storage.save(
+                f'posts/{prefix}_{number}.jpg',
+                ContentFile(buffer.getvalue()),
+            ))
+        return names
+
+    def create_posts(self, user_ids, weights, group_ids, images, total,
+                     image_share):
+        """Посты распределяются по авторам так же, как подписчики:
+        популярные авторы пишут чаще."""
+        for start in range(0, total, CHUNK_SIZE):
+            Post.objects.bulk_create(
+                Post(
+                    text=self.fake.paragraph(nb_sentences=4),
+                    author_id=self.random.choices(
+                        user_ids, cum_weights=weights)[0],
+                    group_id=(self.random.choice(group_ids)
+                              if group_ids and self.random.random() < 0.5
+                              else None),
+                    image=(self.random.choice(images)
+                           if images and self.random.random() < image_share
+                           else ''),
+                )
+                for _ in range(start, min(start + CHUNK_SIZE, total))
+            )
+
+    def create_comments(self, user_ids, post_ids, average):
+        total = int(len(post_ids) * average)
+        for start in range(0, total, CHUNK_SIZE):
+            Comment.objects.bulk_create(
+                Comment(
+                    post_id=self.random.choice(post_ids),
+                    author_id=self.random.choice(user_ids),
+                    text=self.fake.sentence(),
+                )
+                for _ in range(start, min(start + CHUNK_SIZE, total))
+            )
+        return total
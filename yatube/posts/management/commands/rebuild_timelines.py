@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from posts.timeline import rebuild_timelines
+
+
+class Command(BaseCommand):
+    help = 'Пересобирает материализованные ленты подписок с нуля.'
+
+    def handle(self, *args, **options):
+        total = rebuild_timelines()
+        self.stdout.write(self.style.SUCCESS(
+            f'Ленты пересобраны, записей: {total}'
+        ))
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from posts.comment_counts import reconcile_all
+
+
+class Command(BaseCommand):
+    help = (
+        'Сверяет Post.comment_count и Post.last_comment_at с таблицей '
+        'комментариев и исправляет расхождения. Посты обходятся '
+        'диапазонами id, каждый диапазон — отдельная транзакция.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=5000,
+            help='Сколько id постов проверять одной транзакцией.',
+        )
+
+    def handle(self, *args, **options):
+        fixed = reconcile_all(options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Исправлено постов: {fixed}'
+        ))
@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from posts import counters
+
+
+class Command(BaseCommand):
+    help = ('Сбрасывает счётчики постов; они будут пересчитаны '
+            'при следующем обращении.')
+
+    def handle(self, *args, **options):
+        counters.reset()
+        self.stdout.write(self.style.SUCCESS('Счётчики постов сброшены'))
@@ -0,0 +1,29 @@
+# Generated by Django 2.2.16 on 2026-10-18 06:18
+
+from django.db import migrations, models
+import django.db.models.deletion
+import posts.models
+from posts.search_index import create_index
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0012_list_indexes'),
+    ]
+
+    operations = [
+        create_index(),
+        migrations.CreateModel(
+            name='PostSearchIndex',
+            fields=[
+                ('post', models.OneToOneField(db_column='rowid', on_delete=django.db.models.deletion.DO_NOTHING, primary_key=True, related_name='search_index', serialize=False, to='posts.Post')),
+                ('text', posts.models.SearchField()),
+                ('rank', models.FloatField()),
+            ],
+            options={
+                'db_table': 'posts_post_fts',
+                'managed': False,
+            },
+        ),
+    ]
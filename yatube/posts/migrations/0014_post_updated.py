@@ -0,0 +1,36 @@
+# Generated by Django 2.2.16 on 2026-10-18 06:27
+
+from django.db import migrations, models
+
+from posts.search_index import after_table_rebuild, before_table_rebuild
+
+
+def copy_created(apps, schema_editor):
+    Post = apps.get_model('posts', 'Post')
+    Post.objects.update(updated=models.F('created'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0013_post_search_index'),
+    ]
+
+    operations = [
+        before_table_rebuild(),
+        migrations.AddField(
+            model_name='post',
+            name='updated',
+            field=models.DateTimeField(auto_now=True, verbose_name='Дата изменения'),
+        ),
+        migrations.RunPython(copy_created, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['author', '-updated'], name='posts_post_author_updated'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['group', '-updated'], name='posts_post_group_updated'),
+        ),
+        after_table_rebuild(),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 2.2.16 on 2026-10-18 06:42
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from posts.search_index import after_table_rebuild, before_table_rebuild
+
+
+def count_comments(apps, schema_editor):
+    Comment = apps.get_model('posts', 'Comment')
+    Post = apps.get_model('posts', 'Post')
+    comments = Comment.objects.filter(post=OuterRef('pk')).order_by()
+    Post.objects.update(
+        comment_count=Coalesce(Subquery(
+            comments.values('post').annotate(
+                total=Count('pk')).values('total'),
+            output_field=models.IntegerField(),
+        ), 0),
+        last_comment_at=Subquery(
+            comments.order_by('-created').values('created')[:1]),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0014_post_updated'),
+    ]
+
+    operations = [
+        before_table_rebuild(),
+        migrations.AddField(
+            model_name='post',
+            name='comment_count',
+            field=models.PositiveIntegerField(default=0, verbose_name='Комментариев'),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='last_comment_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Последний комментарий'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['-comment_count', '-id'], name='posts_post_comment_count'),
+        ),
+        migrations.RunPython(count_comments, migrations.RunPython.noop),
+        after_table_rebuild(),
+    ]
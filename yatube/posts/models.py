@@ -14,6 +14,22 @@ class Group(models.Model):
         return self.title
 
 
+class PostQuerySet(models.QuerySet):
+    # Поля, которые выводят списки постов и админка
+    LIST_FIELDS = (
+        'id', 'text', 'created', 'updated', 'image',
+        'comment_count', 'last_comment_at',
+        'author', 'author__username',
+        'author__first_name', 'author__last_name',
+        'group', 'group__slug', 'group__title',
+    )
+
+    def for_list(self):
+        """Посты для списков: автор и группа подтягиваются тем же
+        запросом, читаются только поля, нужные шаблонам."""
+        return self.select_related('author', 'group').only(*self.LIST_FIELDS)
+
+
 class Post(CreatedModel):
     text = models.TextField(
         'Текст поста',
@@ -39,15 +55,114 @@ class Post(CreatedModel):
         upload_to='posts/',
         blank=True
     )
+    updated = models.DateTimeField(
+        'Дата изменения',
+        auto_now=True
+    )
+    # Денормализация комментариев, см. posts.comment_counts
+    comment_count = models.PositiveIntegerField(
+        'Комментариев',
+        default=0
+    )
+    last_comment_at = models.DateTimeField(
+        'Последний комментарий',
+        blank=True,
+        null=True
+    )
+
+    objects = PostQuerySet.as_manager()
+
+    COMMENT_FIELDS = ('comment_count', 'last_comment_at')
 
     class Meta:
         ordering = ("-created",)
         verbose_name = 'Пост'
         verbose_name_plural = 'Посты'
+        indexes = [
+            models.Index(
+                fields=['-created', '-id'],
+                name='posts_post_created',
+            ),
+            models.Index(
+                fields=['author', '-created', '-id'],
+                name='posts_post_author_created',
+            ),
+            models.Index(
+                fields=['group', '-created', '-id'],
+                name='posts_post_group_created',
+            ),
+            models.Index(
+                fields=['author', '-updated'],
+                name='posts_post_author_updated',
+            ),
+            models.Index(
+                fields=['group', '-updated'],
+                name='posts_post_group_updated',
+            ),
+            models.Index(
+                fields=['-comment_count', '-id'],
+                name='posts_post_comment_count',
+            ),
+        ]
 
     def __str__(self):
         return self.text
 
+    def save(self, force_insert=False, force_update=False, using=None,
+             update_fields=None):
+        # Поля комментариев меняет только posts.comment_counts: полное
+        # сохранение записало бы прочитанные раньше значения поверх
+        # приращений, сделанных с тех пор
+        if update_fields is None and not force_insert and not (
+                self._state.adding or self.pk is None):
+            deferred = self.get_deferred_fields()
+            update_fields = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key
+                and field.attname not in deferred
+                and field.name not in self.COMMENT_FIELDS
+            ]
+        super().save(force_insert, force_update, using, update_fields)
+
+
+class Match(models.Lookup):
+    """Полнотекстовый поиск FTS5: колонка MATCH запрос."""
+    lookup_name = 'match'
+
+    def as_sql(self, compiler, connection):
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        rhs, rhs_params = self.process_rhs(compiler, connection)
+        return f'{lhs} MATCH {rhs}', lhs_params + rhs_params
+
+
+class SearchField(models.TextField):
+    """Колонка полнотекстового индекса с поиском field__match."""
+
+
+SearchField.register_lookup(Match)
+
+
+class PostSearchIndex(models.Model):
+    """Полнотекстовый индекс FTS5 по текстам постов.
+
+    Виртуальную таблицу создаёт миграция, а заполняют триггеры на
+    posts_post, поэтому модель только читает её. rank — релевантность
+    bm25, имеет смысл только в запросе с match, меньше — лучше.
+    """
+    post = models.OneToOneField(
+        Post,
+        on_delete=models.DO_NOTHING,
+        primary_key=True,
+        db_column='rowid',
+        related_name='search_index',
+    )
+    text = SearchField()
+    rank = models.FloatField()
+
+    class Meta:
+        managed = False
+        db_table = 'posts_post_fts'
+
 
 class Comment(CreatedModel):
     post = models.ForeignKey(
@@ -64,6 +179,12 @@ class Comment(CreatedModel):
 
     class Meta:
         ordering = ('created',)
+        indexes = [
+            models.Index(
+                fields=['post', 'created'],
+                name='posts_comment_post_created',
+            ),
+        ]
 
     def __str__(self):
         return 'Comment by {} on {}'.format(self.author.username, self.post)
@@ -86,3 +207,45 @@ class Follow(models.Model):
 
     def __str__(self):
         return f'user: {self.user.username} author: {self.author.username}'
+
+
+class Counter(models.Model):
+    """Денормализованный счётчик, например число постов автора."""
+    name = models.CharField(max_length=100, unique=True)
+    value = models.IntegerField(default=0)
+
+    def __str__(self):
+        return f'{self.name}: {self.value}'
+
+
+class Timeline(models.Model):
+    """Материализованная лента подписок пользователя.
+
+    Строка появляется, когда автор, на которого подписан пользователь,
+    публикует пост. Поле created дублирует дату поста, чтобы лента
+    читалась одним проходом по индексу (user, -created).
+    """
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='timeline',
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='timeline_entries',
+    )
+    created = models.DateTimeField()
+
+    class Meta:
+        ordering = ('-created',)
+        unique_together = ('user', 'post')
+        indexes = [
+            models.Index(
+                fields=['user', '-created', '-post'],
+                name='posts_timeline_user_created',
+            ),
+        ]
+
+    def __str__(self):
+        return f'user: {self.user_id} post: {self.post_id}'
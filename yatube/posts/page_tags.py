@@ -0,0 +1,49 @@
+"""Теги страниц для кеша анонимных посетителей (см. core.anonymous_cache).
+
+Страница со списком постов зависит от каждого показанного поста, его
+автора и группы, а также от самого списка: новый пост меняет главную,
+страницу своей группы и профиль автора. Пока миниатюры картинки не
+построены, на странице стоит заглушка, поэтому страница зависит и от
+картинки.
+"""
+import hashlib
+
+from core.anonymous_cache import purge
+from core.page_cache import tag_page
+
+INDEX_TAG = 'index'
+
+
+def post_tag(post_id):
+    return f'post:{post_id}'
+
+
+def group_tag(group_id):
+    return f'group:{group_id}'
+
+
+def user_tag(user_id):
+    return f'user:{user_id}'
+
+
+def image_tag(image_name):
+    return f'image:{hashlib.md5(image_name.encode()).hexdigest()}'
+
+
+def tag_posts(request, posts, *tags):
+    """Помечает страницу тегами posts и дополнительными tags."""
+    for post in posts:
+        tags += (post_tag(post.pk), user_tag(post.author_id))
+        if post.group_id is not None:
+            tags += (group_tag(post.group_id),)
+        if post.image:
+            tags += (image_tag(post.image.name),)
+    tag_page(request, *tags)
+
+
+def purge_post_lists(post, *group_ids):
+    """Сбрасывает списки, в которые post попадает или из которых уходит."""
+    tags = [INDEX_TAG, post_tag(post.pk), user_tag(post.author_id)]
+    tags.extend(group_tag(group_id) for group_id in group_ids
+                if group_id is not None)
+    purge(*tags)
@@ -0,0 +1,38 @@
+"""Полнотекстовый поиск по постам через индекс FTS5.
+
+Запрос пользователя разбивается на слова, каждое берётся в кавычки,
+поэтому синтаксис FTS5 (OR, NEAR, скобки) в запросе не действует. Слово
+со звёздочкой на конце ищется по префиксу. Результаты упорядочены по
+релевантности bm25, при равной — по id.
+"""
+import re
+
+from django.db.models import F
+
+from .models import Post
+
+SEARCH_ORDERING = ('rank', 'id')
+WORD = re.compile(r'(\w+)(\*?)')
+
+
+def build_match(query):
+    """Выражение MATCH для FTS5 или None, если в запросе нет слов."""
+    terms = [
+        f'"{word}"{star}' for word, star in WORD.findall(query)
+    ]
+    return ' '.join(terms) or None
+
+
+def search_posts(query, group=None, author=None):
+    """Посты, найденные по запросу, с релевантностью в поле rank."""
+    match = build_match(query)
+    if match is None:
+        return Post.objects.none()
+    posts = Post.objects.for_list().filter(
+        search_index__text__match=match
+    ).annotate(rank=F('search_index__rank')).order_by(*SEARCH_ORDERING)
+    if group is not None:
+        posts = posts.filter(group=group)
+    if author:
+        posts = posts.filter(author__username=author)
+    return posts
@@ -0,0 +1,79 @@
+"""DDL полнотекстового индекса постов (FTS5, только SQLite).
+
+Индекс — внешняя таблица posts_post_fts с содержимым из posts_post,
+её синхронизируют триггеры на вставку, удаление и изменение текста.
+SQLite пересоздаёт таблицу при добавлении колонки и удаляет вместе со
+старой таблицей её триггеры, поэтому миграция, меняющая posts_post,
+окружает свои операции парой before_table_rebuild() и
+after_table_rebuild(). Модуль не импортирует модели, чтобы миграции не
+зависели от их текущего состояния.
+"""
+from django.db import migrations
+
+TRIGGERS = ('posts_post_fts_insert', 'posts_post_fts_delete',
+            'posts_post_fts_update')
+
+CREATE_TABLE = """
+    CREATE VIRTUAL TABLE posts_post_fts USING fts5(
+        text,
+        content='posts_post',
+        content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2',
+        prefix='2 3'
+    )
+"""
+DROP_TABLE = 'DROP TABLE IF EXISTS posts_post_fts'
+REBUILD = "INSERT INTO posts_post_fts (posts_post_fts) VALUES ('rebuild')"
+
+CREATE_TRIGGERS = (
+    """
+    CREATE TRIGGER posts_post_fts_insert AFTER INSERT ON posts_post BEGIN
+        INSERT INTO posts_post_fts (rowid, text) VALUES (new.id, new.text);
+    END
+    """,
+    """
+    CREATE TRIGGER posts_post_fts_delete AFTER DELETE ON posts_post BEGIN
+        INSERT INTO posts_post_fts (posts_post_fts, rowid, text)
+        VALUES ('delete', old.id, old.text);
+    END
+    """,
+    """
+    CREATE TRIGGER posts_post_fts_update AFTER UPDATE OF text ON posts_post
+    BEGIN
+        INSERT INTO posts_post_fts (posts_post_fts, rowid, text)
+        VALUES ('delete', old.id, old.text);
+        INSERT INTO posts_post_fts (rowid, text) VALUES (new.id, new.text);
+    END
+    """,
+)
+DROP_TRIGGERS = tuple(f'DROP TRIGGER IF EXISTS {name}' for name in TRIGGERS)
+
+
+def run_on_sqlite(statements):
+    def operation(apps, schema_editor):
+        if schema_editor.connection.vendor == 'sqlite':
+            for statement in statements:
+                schema_editor.execute(statement)
+    return operation
+
+
+def create_index():
+    return migrations.RunPython(
+        run_on_sqlite((CREATE_TABLE, *CREATE_TRIGGERS, REBUILD)),
+        run_on_sqlite((*DROP_TRIGGERS, DROP_TABLE)),
+    )
+
+
+def before_table_rebuild():
+    """При откате миграции возвращает триггеры, пропавшие вместе с
+    пересозданной заново таблицей."""
+    return migrations.RunPython(
+        migrations.RunPython.noop, run_on_sqlite(CREATE_TRIGGERS),
+    )
+
+
+def after_table_rebuild():
+    """Создаёт триггеры заново после пересоздания таблицы."""
+    return migrations.RunPython(
+        run_on_sqlite(CREATE_TRIGGERS), run_on_sqlite(DROP_TRIGGERS),
+    )
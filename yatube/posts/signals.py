@@ -0,0 +1,153 @@
+from django.contrib.auth import get_user_model
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from core.anonymous_cache import purge
+from core.page_cache import bump_generation
+
+from . import cards, comment_counts, counters, thumbnails, timeline
+from .page_tags import group_tag, post_tag, purge_post_lists, user_tag
+from .models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+
+def only_login(update_fields):
+    """Сохранение при входе пользователя меняет только last_login,
+    которого нет ни на страницах, ни в карточках."""
+    return bool(update_fields) and set(update_fields) <= {'last_login'}
+
+
+@receiver(post_save, sender=Post)
+def push_post_to_timelines(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        timeline.push_post(instance)
+
+
+@receiver(post_save, sender=Follow)
+def add_author_to_timeline(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        timeline.follow(instance.user_id, instance.author_id)
+        counters.reset_feed_count(instance.user_id)
+
+
+@receiver(post_delete, sender=Follow)
+def remove_author_from_timeline(sender, instance, **kwargs):
+    timeline.unfollow(instance.user_id, instance.author_id)
+    counters.reset_feed_count(instance.user_id)
+
+
+@receiver(post_save, sender=Post)
+def prepare_thumbnails(sender, instance, raw=False, **kwargs):
+    if instance.image and not raw:
+        thumbnails.schedule_after_commit(instance.image.name)
+
+
+@receiver(pre_save, sender=Post)
+def remember_post_group(sender, instance, raw=False, **kwargs):
+    if instance.pk is not None and not raw:
+        instance._saved_group_id = Post.objects.filter(
+            pk=instance.pk
+        ).values_list('group_id', flat=True).first()
+
+
+@receiver(post_save, sender=Post)
+def count_saved_post(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    if created:
+        counters.change(
+            counters.post_keys(instance.author_id, instance.group_id), 1)
+        return
+    saved_group_id = getattr(instance, '_saved_group_id', None)
+    if saved_group_id != instance.group_id:
+        if saved_group_id is not None:
+            counters.change([counters.group_key(saved_group_id)], -1)
+        if instance.group_id is not None:
+            counters.change([counters.group_key(instance.group_id)], 1)
+
+
+@receiver(post_delete, sender=Post)
+def count_deleted_post(sender, instance, **kwargs):
+    counters.change(
+        counters.post_keys(instance.author_id, instance.group_id), -1)
+
+
+@receiver(post_save, sender=Comment)
+def count_saved_comment(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        comment_counts.comment_added(instance)
+
+
+@receiver(post_delete, sender=Comment)
+def count_deleted_comment(sender, instance, **kwargs):
+    comment_counts.comment_removed(instance)
+
+
+@receiver(post_delete, sender=Group)
+def drop_group_counter(sender, instance, **kwargs):
+    counters.reset_group(instance.pk)
+
+
+def bump_page_generation(sender, raw=False, **kwargs):
+    if not raw:
+        bump_generation()
+
+
+for model in (Post, Group, Comment, Follow):
+    post_save.connect(bump_page_generation, sender=model)
+    post_delete.connect(bump_page_generation, sender=model)
+
+
+def bump_card_version(sender, instance, raw=False, update_fields=None,
+                      **kwargs):
+    if not (raw or only_login(update_fields)):
+        kind = 'user' if sender is User else sender._meta.model_name
+        cards.bump_version(cards.version_key(kind, instance.pk))
+
+
+for model in (Post, Group, User):
+    post_save.connect(bump_card_version, sender=model)
+post_delete.connect(bump_card_version, sender=Post)
+
+
+@receiver(post_save, sender=Post)
+def purge_saved_post_pages(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    saved_group_id = getattr(instance, '_saved_group_id', None)
+    if created or saved_group_id != instance.group_id:
+        purge_post_lists(instance, saved_group_id, instance.group_id)
+    else:
+        purge(post_tag(instance.pk))
+
+
+@receiver(post_delete, sender=Post)
+def purge_deleted_post_pages(sender, instance, **kwargs):
+    purge_post_lists(instance, instance.group_id)
+
+
+def purge_comment_pages(sender, instance, raw=False, **kwargs):
+    if not raw:
+        purge(post_tag(instance.post_id))
+
+
+post_save.connect(purge_comment_pages, sender=Comment)
+post_delete.connect(purge_comment_pages, sender=Comment)
+
+
+def purge_group_pages(sender, instance, raw=False, **kwargs):
+    if not raw:
+        purge(group_tag(instance.pk))
+
+
+post_save.connect(purge_group_pages, sender=Group)
+post_delete.connect(purge_group_pages, sender=Group)
+
+
+@receiver(post_save, sender=User)
+def purge_user_pages(sender, instance, raw=False, update_fields=None,
+                     **kwargs):
+    if raw or only_login(update_fields):
+        return
+    purge(user_tag(instance.pk))
@@ -0,0 +1,25 @@
+from django import template
+from django.conf import settings
+
+from posts import thumbnails
+
+register = template.Library()
+
+
+@register.simple_tag
+def ready_thumbnail(image, name):
+    """Готовая миниатюра картинки поста или None.
+
+    Если миниатюры ещё нет, её построение ставится в очередь после
+    завершения текущей транзакции, а шаблон выводит заглушку.
+    """
+    if not image:
+        return None
+    thumbnail = thumbnails.get_ready_thumbnail(image, name)
+    if thumbnail is None:
+        if settings.THUMBNAIL_WORKERS:
+            thumbnails.schedule_after_commit(image.name)
+        else:
+            thumbnails.generate(image.name)
+            thumbnail = thumbnails.get_ready_thumbnail(image, name)
+    return thumbnail
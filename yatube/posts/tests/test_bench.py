@@ -0,0 +1,40 @@
+import shutil
+import tempfile
+from io import StringIO
+
+from django.conf import settings
+from django.core.management import call_command
+from django.db.models import Sum
+from django.test import TestCase, override_settings
+
+from posts.models import Comment, Follow, Post, Timeline
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, THUMBNAIL_WORKERS=0)
+class BenchCommandsTest(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def test_generate_graph_and_bench(self):
+        """Граф создаётся вместе с лентами, замер проходит по всем
+        сценариям."""
+        call_command('generate_social_graph', users=10, posts=40,
+                     groups=2, following=3, comments=1, images=1,
+                     stdout=StringIO())
+        self.assertEqual(Post.objects.count(), 40)
+        self.assertTrue(Follow.objects.exists())
+        self.assertTrue(Timeline.objects.exists())
+        comments = Comment.objects.count()
+        out = StringIO()
+        call_command('bench_posts', requests=2, stdout=out)
+        for scenario in ('index', 'follow_index', 'add_comment'):
+            self.assertIn(scenario, out.getvalue())
+        self.assertEqual(Post.objects.count(), 40)
+        self.assertEqual(Comment.objects.count(), comments)
+        self.assertEqual(
+            Post.objects.aggregate(total=Sum('comment_count'))['total'],
+            comments)
@@ -0,0 +1,92 @@
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.template.loader import render_to_string
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from posts import thumbnails
+from posts.cards import render_cards
+from posts.models import Follow, Group, Post
+
+User = get_user_model()
+
+
+class CardCacheTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(
+            username='author', first_name='Лев', last_name='Толстой')
+        cls.group = Group.objects.create(title='Проза', slug='prose',
+                                         description='Проза')
+        cls.post = Post.objects.create(text='Война и мир', author=cls.author,
+                                       group=cls.group)
+
+    def setUp(self):
+        cache.clear()
+
+    def render(self):
+        posts = Post.objects.for_list()
+        with mock.patch('posts.cards.render_to_string',
+                        wraps=render_to_string) as render:
+            cards = render_cards(posts)
+        return cards, render.call_count
+
+    def test_cards_cached(self):
+        """Повторный вывод берёт карточку из кеша."""
+        cards, rendered = self.render()
+        self.assertEqual(rendered, 1)
+        self.assertIn('Война и мир', cards[0])
+        self.assertIn(reverse('posts:group_list', args=['prose']), cards[0])
+        self.assertEqual(self.render(), (cards, 0))
+
+    def test_changes_rerender_card(self):
+        """Изменение поста, автора или группы перерисовывает карточку."""
+        post = Post.objects.get(pk=self.post.pk)
+        self.render()
+        post.text = 'Анна Каренина'
+        post.save()
+        cards, _ = self.render()
+        self.assertIn('Анна Каренина', cards[0])
+        post.author.last_name = 'Толстой-младший'
+        post.author.save()
+        cards, _ = self.render()
+        self.assertIn('Толстой-младший', cards[0])
+        post.group.slug = 'novels'
+        post.group.save()
+        cards, _ = self.render()
+        self.assertIn(reverse('posts:group_list', args=['novels']), cards[0])
+
+    def test_login_keeps_card(self):
+        """Вход автора (сохранение last_login) не сбрасывает карточку."""
+        self.render()
+        self.author.save(update_fields=['last_login'])
+        self.assertEqual(self.render()[1], 0)
+
+    def test_thumbnail_rerenders_card(self):
+        """Построенная миниатюра сбрасывает карточку с заглушкой."""
+        post = Post.objects.get(pk=self.post.pk)
+        post.image = 'posts/missing.jpg'
+        post.save()
+        self.render()
+        thumbnails.generate_in_worker('posts/missing.jpg')
+        self.assertEqual(self.render()[1], 1)
+
+    def test_follow_page_per_user(self):
+        """Лента подписок не показывает одному читателю ленту другого."""
+        stranger = User.objects.create_user(username='stranger')
+        other = Post.objects.create(text='Чужой пост', author=stranger)
+        reader = User.objects.create_user(username='reader')
+        fan = User.objects.create_user(username='fan')
+        Follow.objects.create(user=reader, author=self.author)
+        Follow.objects.create(user=fan, author=stranger)
+        url = reverse('posts:follow_index')
+        client = Client()
+        client.force_login(reader)
+        self.assertContains(client.get(url), self.post.text)
+        client.force_login(fan)
+        response = client.get(url)
+        self.assertContains(response, other.text)
+        self.assertNotContains(response, self.post.text)
@@ -0,0 +1,77 @@
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from posts.models import Comment, Post
+
+User = get_user_model()
+
+
+class CommentCountTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.post = Post.objects.create(text='Пост', author=cls.author)
+
+    def refresh(self):
+        return Post.objects.get(pk=self.post.pk)
+
+    def test_add_comment_updates_post(self):
+        client = Client()
+        client.force_login(self.author)
+        client.post(reverse('posts:add_comment', args=[self.post.pk]),
+                    {'text': 'Комментарий'})
+        comment = Comment.objects.get()
+        post = self.refresh()
+        self.assertEqual(post.comment_count, 1)
+        self.assertEqual(post.last_comment_at, comment.created)
+
+    def test_delete_restores_previous_comment(self):
+        first = Comment.objects.create(post=self.post, author=self.author,
+                                       text='Первый')
+        Comment.objects.create(post=self.post, author=self.author,
+                               text='Второй').delete()
+        post = self.refresh()
+        self.assertEqual(post.comment_count, 1)
+        self.assertEqual(post.last_comment_at, first.created)
+        first.delete()
+        post = self.refresh()
+        self.assertEqual(post.comment_count, 0)
+        self.assertIsNone(post.last_comment_at)
+
+    def test_edit_keeps_concurrent_comment(self):
+        """Сохранение поста, прочитанного до нового комментария, не
+        затирает его счётчик."""
+        post = self.refresh()
+        client = Client()
+        client.force_login(self.author)
+        client.post(reverse('posts:add_comment', args=[self.post.pk]),
+                    {'text': 'Комментарий'})
+        post.text = 'Исправленный пост'
+        post.save()
+        post = self.refresh()
+        self.assertEqual(post.text, 'Исправленный пост')
+        self.assertEqual(post.comment_count, 1)
+        self.assertIsNotNone(post.last_comment_at)
+
+    def test_reconcile_repairs_drift(self):
+        """Команда исправляет комментарии, созданные мимо сигналов."""
+        other = Post.objects.create(text='Другой пост', author=self.author)
+        Comment.objects.bulk_create(
+            Comment(post=self.post, author=self.author, text=str(number))
+            for number in range(3)
+        )
+        out = StringIO()
+        call_command('reconcile_comment_counts', batch_size=1, stdout=out)
+        self.assertIn('Исправлено постов: 1', out.getvalue())
+        post = self.refresh()
+        self.assertEqual(post.comment_count, 3)
+        self.assertEqual(post.last_comment_at,
+                         Comment.objects.latest('created').created)
+        self.assertEqual(Post.objects.get(pk=other.pk).comment_count, 0)
+        call_command('reconcile_comment_counts', stdout=out)
+        self.assertIn('Исправлено постов: 0', out.getvalue())
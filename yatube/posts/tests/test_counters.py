@@ -0,0 +1,118 @@
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import QuerySet
+from django.http import HttpResponse
+from django.test import Client, RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from core.replicas import read_from_replica
+from posts import counters
+from posts.models import Counter, Group, Post
+
+User = get_user_model()
+
+
+class PostCountersTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='Franky_Four_Fingers')
+        cls.group = Group.objects.create(
+            title='группа',
+            description='описание группы',
+            slug='test-slug')
+        cls.other_group = Group.objects.create(
+            title='группа 2',
+            description='описание группы 2',
+            slug='test-slug2')
+        for number in range(3):
+            Post.objects.create(text=f'Текст {number}',
+                                author=cls.user,
+                                group=cls.group)
+
+    def setUp(self):
+        self.guest_client = Client()
+        cache.clear()
+
+    def assertCounts(self, total, author, group, other_group):
+        self.assertEqual(counters.posts_count(), total)
+        self.assertEqual(counters.author_posts_count(self.user), author)
+        self.assertEqual(counters.group_posts_count(self.group), group)
+        self.assertEqual(counters.group_posts_count(self.other_group),
+                         other_group)
+
+    def test_counters_follow_changes(self):
+        """Счётчики меняются при создании, правке и удалении поста."""
+        self.assertCounts(3, 3, 3, 0)
+        post = Post.objects.create(text='Новый', author=self.user)
+        self.assertCounts(4, 4, 3, 0)
+        post.group = self.other_group
+        post.save()
+        self.assertCounts(4, 4, 3, 1)
+        post.delete()
+        self.assertCounts(3, 3, 3, 0)
+
+    def test_post_created_while_seeding(self):
+        """Пост, созданный перед заведением счётчика, в нём учтён."""
+        create = QuerySet.create
+
+        def create_post_first(queryset, **kwargs):
+            if queryset.model is Counter:
+                Post.objects.create(text='Гонка', author=self.user)
+            return create(queryset, **kwargs)
+
+        with mock.patch.object(QuerySet, 'create', autospec=True,
+                               side_effect=create_post_first):
+            self.assertEqual(counters.posts_count(), 4)
+        self.assertEqual(counters.posts_count(), 4)
+
+    def test_counter_seeded_concurrently(self):
+        """Если счётчик завёл другой запрос, берётся его значение."""
+        Counter.objects.create(name=counters.ALL_POSTS, value=3)
+        value = counters.seed(counters.ALL_POSTS, Post.objects.none(),
+                              'default')
+        self.assertEqual(value, 3)
+
+    @override_settings(DATABASE_REPLICAS=['replica'])
+    def test_counters_ignore_replicas(self):
+        """Представление с репликами читает и заводит счётчики в основной
+        базе: запрос к реплике в этом тесте был бы ошибкой."""
+        @read_from_replica
+        def view(request):
+            return HttpResponse(f'{counters.posts_count()} '
+                                f'{counters.group_posts_count(self.group)}')
+
+        response = view(RequestFactory().get('/'))
+        self.assertEqual(response.content, b'3 3')
+
+    def test_list_pages_do_not_count(self):
+        """Списки постов не выполняют COUNT(*) после заведения счётчиков."""
+        reverse_names = [
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': self.group.slug}),
+            reverse('posts:profile',
+                    kwargs={'username': self.user.username}),
+            reverse('posts:post_detail',
+                    kwargs={'post_id': Post.objects.first().id}),
+        ]
+        for reverse_name in reverse_names:
+            with self.subTest(reverse_name=reverse_name):
+                self.guest_client.get(reverse_name)
+                cache.clear()
+                with CaptureQueriesContext(connection) as queries:
+                    response = self.guest_client.get(reverse_name)
+                self.assertEqual(response.status_code, 200)
+                for query in queries.captured_queries:
+                    self.assertNotIn('COUNT(', query['sql'])
+
+    def test_profile_shows_posts_count(self):
+        """Профиль показывает число постов автора из счётчика."""
+        response = self.guest_client.get(
+            reverse('posts:profile', kwargs={'username': self.user.username})
+        )
+        self.assertEqual(response.context['posts_count'], 3)
+        self.assertContains(response, 'Всего постов: 3')
@@ -0,0 +1,12 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase
+
+
+class QueryPlansTest(TestCase):
+    def test_pages_use_indexes(self):
+        """Запросы страниц постов читают таблицы по индексам."""
+        out = StringIO()
+        call_command('audit_query_plans', stdout=out)
+        self.assertIn('Все планы используют индексы', out.getvalue())
@@ -0,0 +1,77 @@
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from posts.models import Group, Post
+from posts.search import build_match, search_posts
+from posts.search_index import TRIGGERS
+
+User = get_user_model()
+
+
+class SearchTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.group = Group.objects.create(title='Кошки', slug='cats',
+                                         description='Про кошек')
+        cls.often = Post.objects.create(
+            text='Кошка, кошка и ещё раз кошка', author=cls.author,
+            group=cls.group)
+        cls.once = Post.objects.create(
+            text='Про собаку и одну кошку упомянем', author=cls.author)
+        Post.objects.create(text='Совсем о другом', author=cls.author)
+
+    def test_build_match_quotes_words(self):
+        """Синтаксис FTS5 из запроса экранируется, звёздочка остаётся."""
+        self.assertEqual(build_match('кошка OR "соб*'), '"кошка" "OR" "соб"*')
+        self.assertIsNone(build_match(' -- '))
+
+    def test_results_ranked(self):
+        """Пост, где слово встречается чаще, выше в выдаче."""
+        self.assertEqual(list(search_posts('кошка')), [self.often])
+        self.assertEqual(list(search_posts('кош*')), [self.often, self.once])
+
+    def test_group_filter(self):
+        self.assertEqual(list(search_posts('кош*', group=self.group)),
+                         [self.often])
+
+    def test_triggers_survive_migrations(self):
+        """После всех миграций, пересоздающих posts_post, триггеры
+        индекса на месте."""
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT name FROM sqlite_master "
+                "WHERE type = 'trigger' AND tbl_name = 'posts_post'"
+            )
+            names = {name for name, in cursor.fetchall()}
+        self.assertEqual(names, set(TRIGGERS))
+
+    def test_index_follows_edits(self):
+        """Триггеры обновляют индекс при изменении и удалении поста."""
+        post = Post.objects.create(text='Попугай', author=self.author)
+        self.assertEqual(list(search_posts('попугай')), [post])
+        post.text = 'Канарейка'
+        post.save()
+        self.assertFalse(search_posts('попугай').exists())
+        self.assertEqual(list(search_posts('канарейка')), [post])
+        post.delete()
+        self.assertFalse(search_posts('канарейка').exists())
+
+    def test_search_page(self):
+        """Страница поиска показывает найденные посты и фильтры."""
+        response = Client().get(reverse('posts:search'),
+                                {'q': 'кош*', 'group': 'cats'})
+        self.assertEqual(list(response.context['page_obj']), [self.often])
+        self.assertIn('group=cats', response.context['page_query'])
+
+    def test_admin_search(self):
+        admin = User.objects.create_superuser('admin', 'a@a.ru', 'pass')
+        client = Client()
+        client.force_login(admin)
+        response = client.get(reverse('admin:posts_post_changelist'),
+                              {'q': 'собак*'})
+        self.assertEqual(list(response.context['cl'].result_list),
+                         [self.once])
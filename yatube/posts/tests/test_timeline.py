@@ -0,0 +1,128 @@
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.urls import reverse
+from django.test import TestCase, override_settings
+
+from posts.models import Follow, Post, Timeline
+from posts.timeline import HybridFeed, get_feed, get_follow_feed
+
+User = get_user_model()
+
+
+class TimelineTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.reader = User.objects.create_user(username='reader')
+        cls.author = User.objects.create_user(username='author')
+        cls.stranger = User.objects.create_user(username='stranger')
+        cls.old_post = Post.objects.create(text='Старый пост',
+                                           author=cls.author)
+        Post.objects.create(text='Чужой пост', author=cls.stranger)
+
+    def test_follow_fills_timeline(self):
+        """Подписка добавляет в ленту уже опубликованные посты автора."""
+        Follow.objects.create(user=self.reader, author=self.author)
+        self.assertEqual(list(get_feed(self.reader)), [self.old_post])
+
+    def test_new_post_pushed_to_followers(self):
+        """Новый пост попадает в ленты подписчиков и только в них."""
+        Follow.objects.create(user=self.reader, author=self.author)
+        new_post = Post.objects.create(text='Новый пост', author=self.author)
+        self.assertEqual(list(get_feed(self.reader)),
+                         [new_post, self.old_post])
+        self.assertFalse(get_feed(self.stranger).exists())
+
+    def test_unfollow_clears_timeline(self):
+        """Отписка убирает посты автора из ленты."""
+        Follow.objects.create(user=self.reader, author=self.author)
+        self.reader.follower.filter(author=self.author).delete()
+        self.assertFalse(get_feed(self.reader).exists())
+
+    def test_rebuild_timelines_command(self):
+        """Команда rebuild_timelines восстанавливает ленты по подпискам."""
+        Follow.objects.create(user=self.reader, author=self.author)
+        Timeline.objects.all().delete()
+        call_command('rebuild_timelines', stdout=StringIO())
+        self.assertEqual(list(get_feed(self.reader)), [self.old_post])
+
+
+@override_settings(FEED_PULL_THRESHOLD=2)
+class HybridFeedTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.reader = User.objects.create_user(username='reader')
+        cls.fan = User.objects.create_user(username='fan')
+        cls.star = User.objects.create_user(username='star')
+        cls.author = User.objects.create_user(username='author')
+
+    def setUp(self):
+        Follow.objects.create(user=self.reader, author=self.star)
+        Follow.objects.create(user=self.fan, author=self.star)
+        Follow.objects.create(user=self.reader, author=self.author)
+
+    def test_popular_author_not_pushed(self):
+        """Посты автора выше порога не раскладываются по лентам."""
+        Post.objects.create(text='Пост звезды', author=self.star)
+        self.assertFalse(Timeline.objects.filter(
+            post__author=self.star).exists())
+
+    def test_feed_merges_pulled_authors(self):
+        """Лента сливает материализованную часть и посты звезды."""
+        posts = [
+            Post.objects.create(text=f'Пост {number}', author=author)
+            for number, author in enumerate(
+                [self.author, self.star, self.author, self.star])
+        ]
+        feed = get_follow_feed(self.reader)
+        self.assertIsInstance(feed, HybridFeed)
+        self.assertEqual(feed.count(), 4)
+        self.assertEqual(feed[:4], posts[::-1])
+        self.assertEqual(feed[1:3], posts[2:0:-1])
+        self.client.force_login(self.reader)
+        response = self.client.get(reverse('posts:follow_index'))
+        self.assertEqual(list(response.context['page_obj']), posts[::-1])
+
+    def test_author_falls_below_threshold(self):
+        """После отписки ниже порога посты возвращаются в ленты."""
+        post = Post.objects.create(text='Пост звезды', author=self.star)
+        self.fan.follower.filter(author=self.star).delete()
+        self.assertEqual(list(get_follow_feed(self.reader)), [post])
+        self.assertTrue(Timeline.objects.filter(
+            user=self.reader, post=post).exists())
+
+
+class FollowBudgetTest(TestCase):
+    """Бюджет запросов растёт с работой, которую делает запрос."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.reader = User.objects.create_user(username='reader')
+
+    def setUp(self):
+        self.client.force_login(self.reader)
+
+    def test_follow_prolific_author(self):
+        author = User.objects.create_user(username='author')
+        Post.objects.bulk_create(
+            Post(text=f'Пост {number}', author=author)
+            for number in range(1000)
+        )
+        response = self.client.get(
+            reverse('posts:profile_follow', args=['author']))
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(Timeline.objects.filter(user=self.reader).count(),
+                         1000)
+
+    @override_settings(FEED_PULL_THRESHOLD=1)
+    def test_feed_with_many_pulled_authors(self):
+        for number in range(5):
+            author = User.objects.create_user(username=f'star_{number}')
+            Post.objects.create(text=f'Пост {number}', author=author)
+            Follow.objects.create(user=self.reader, author=author)
+        response = self.client.get(reverse('posts:follow_index'))
+        self.assertEqual(len(response.context['page_obj']), 5)
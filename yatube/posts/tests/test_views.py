@@ -1,5 +1,10 @@
+import base64
+import json
 import shutil
 import tempfile
+import threading
+from unittest import mock
+
 from django.contrib.auth import get_user_model
 from django.urls import reverse
 from django import forms
@@ -7,15 +12,21 @@ from django.core.files.uploadedfile import SimpleUploadedFile
 from django.test import TestCase, Client, override_settings
 from django.core.cache import cache
 from django.conf import settings
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 
-from posts.models import Post, Group
+from core.anonymous_cache import purge
+from core.page_cache import page_cache_stats, reset_page_cache_stats
+from posts import counters, thumbnails
+from posts.page_tags import post_tag
+from posts.models import Comment, Follow, Post, Group
 
 User = get_user_model()
 
 TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
 
 
-@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, THUMBNAIL_WORKERS=0)
 class PostURLTest(TestCase):
     @classmethod
     def setUpClass(cls):
@@ -217,20 +228,54 @@ class PostURLTest(TestCase):
                          'Группа, к которой будет относиться пост')
 
     def test_cache_index(self):
-        """Проверка хранения и очистки кэша для index."""
+        """Проверка хранения и сброса кэша для index."""
         response = self.authorized_client.get(reverse('posts:index'))
         posts = response.content
+        Post.objects.filter(pk=self.post.pk).update(text='Без сигналов')
+        response_old = self.authorized_client.get(reverse('posts:index'))
+        self.assertEqual(response_old.content, posts)
         Post.objects.create(
             text='test_cache',
             author=self.user,
         )
-        response_old = self.authorized_client.get(reverse('posts:index'))
-        old_posts = response_old.content
-        self.assertEqual(old_posts, posts)
-        cache.clear()
         response_new = self.authorized_client.get(reverse('posts:index'))
-        new_posts = response_new.content
-        self.assertNotEqual(old_posts, new_posts)
+        self.assertNotEqual(response_new.content, posts)
+        self.assertContains(response_new, 'test_cache')
+
+    def test_cache_invalidated_by_changes(self):
+        """Изменения постов, групп и комментариев сразу видны на
+        закешированных страницах."""
+        urls = [
+            reverse('posts:index'),
+            reverse('posts:group_list',
+                    kwargs={'slug': self.test_group.slug}),
+            reverse('posts:profile',
+                    kwargs={'username': self.user.username}),
+        ]
+        for url in urls:
+            self.guest_client.get(url)
+        post = Post.objects.get(pk=self.post.pk)
+        post.text = 'Исправленный текст'
+        post.save()
+        for url in urls:
+            with self.subTest(url=url):
+                self.assertContains(self.guest_client.get(url),
+                                    'Исправленный текст')
+        group = Group.objects.get(pk=self.test_group.pk)
+        group.description = 'Новое описание'
+        group.save()
+        self.assertContains(
+            self.guest_client.get(urls[1]), 'Новое описание')
+
+    def test_page_cache_hit_rate(self):
+        """Повторный запрос страницы отдаётся из кэша."""
+        reset_page_cache_stats()
+        self.authorized_client.get(reverse('posts:index'))
+        self.authorized_client.get(reverse('posts:index'))
+        stats = page_cache_stats()['index_page']
+        self.assertEqual(stats['hits'], 1)
+        self.assertEqual(stats['misses'], 1)
+        self.assertEqual(stats['hit_rate'], 0.5)
 
 
 class PaginatorViewsTest(TestCase):
@@ -304,3 +349,419 @@ class PaginatorViewsTest(TestCase):
             self.assertEqual(posts, new_post)
         dif_group = self.test_group.grouped_posts.all()
         self.assertNotIn(new_post, dif_group)
+
+
+class LargePaginationTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+
+    def add_posts(self, count):
+        Post.objects.bulk_create(
+            Post(text='Пост', author=self.author) for _ in range(count))
+        counters.reset()
+        cache.clear()
+
+    def get_page(self, page):
+        return Client().get(reverse('posts:index'), {'page': page})
+
+    def test_page_links_do_not_grow_with_posts(self):
+        """Размер страницы не растёт вместе с числом страниц."""
+        self.add_posts(200)
+        small = self.get_page(10)
+        self.add_posts(19800)
+        large = self.get_page(10)
+        self.assertEqual(large.context['page_obj'].paginator.num_pages, 2000)
+        self.assertEqual(large.content.count(b'page-item'),
+                         small.content.count(b'page-item'))
+        self.assertLess(len(large.content) - len(small.content), 100)
+        self.assertEqual(large.context['page_obj'].page_window,
+                         [1, None, 8, 9, 10, 11, 12, None, 2000])
+
+
+class ConditionalGetTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.group = Group.objects.create(title='Группа', slug='group',
+                                         description='Описание')
+        cls.post = Post.objects.create(text='Пост', author=cls.author,
+                                       group=cls.group)
+
+    def setUp(self):
+        cache.clear()
+        self.urls = [
+            reverse('posts:post_detail', args=[self.post.pk]),
+            reverse('posts:profile', args=[self.author.username]),
+            reverse('posts:group_list', args=[self.group.slug]),
+        ]
+
+    def test_unchanged_page_not_modified(self):
+        """Повторный запрос с ETag получает 304 после одного запроса
+        к базе."""
+        for url in self.urls:
+            with self.subTest(url=url):
+                # Первый показ заводит счётчики постов. Запросы идут мимо
+                # кеша страниц для анонимных посетителей
+                self.client.get(url)
+                purge(post_tag(self.post.pk))
+                etag = self.client.get(url)['ETag']
+                purge(post_tag(self.post.pk))
+                with self.assertNumQueries(1):
+                    response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 304)
+
+    def test_last_modified(self):
+        url = self.urls[1]
+        self.client.get(url)
+        last_modified = self.client.get(url)['Last-Modified']
+        response = self.client.get(url, HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, 304)
+
+    def test_changes_update_etag(self):
+        """Новый пост и комментарий меняют ETag страниц."""
+        for url in self.urls:
+            self.client.get(url)
+        etags = [self.client.get(url)['ETag'] for url in self.urls]
+        Post.objects.create(text='Ещё пост', author=self.author,
+                            group=self.group)
+        Comment.objects.create(post=self.post, author=self.author,
+                               text='Комментарий')
+        for url, etag in zip(self.urls, etags):
+            with self.subTest(url=url):
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 200)
+
+    def test_etag_per_user(self):
+        """Другой пользователь не получает 304 по чужому ETag."""
+        etag = self.client.get(self.urls[0])['ETag']
+        self.client.force_login(self.author)
+        response = self.client.get(self.urls[0], HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+
+class CursorPaginationViewsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='Bullet_Tooth_Tony')
+        cls.group = Group.objects.create(
+            title='группа',
+            description='описание группы',
+            slug='test-slug')
+        for number in range(15):
+            Post.objects.create(text=f'Текст {number}',
+                                author=cls.user,
+                                group=cls.group)
+
+    def setUp(self):
+        self.guest_client = Client()
+        cache.clear()
+
+    def test_cursor_pages(self):
+        """Курсоры ведут на следующую и обратно на предыдущую страницу."""
+        reverse_names = [
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': self.group.slug}),
+            reverse('posts:profile',
+                    kwargs={'username': self.user.username}),
+        ]
+        expected = list(Post.objects.order_by('-created', '-id'))
+        for reverse_name in reverse_names:
+            with self.subTest(reverse_name=reverse_name):
+                first_page = self.guest_client.get(
+                    reverse_name, {'cursor': ''}).context['page_obj']
+                self.assertEqual(list(first_page), expected[:10])
+                self.assertFalse(first_page.has_previous())
+                second_page = self.guest_client.get(
+                    reverse_name,
+                    {'cursor': first_page.next_cursor}
+                ).context['page_obj']
+                self.assertEqual(list(second_page), expected[10:])
+                self.assertFalse(second_page.has_next())
+                back_page = self.guest_client.get(
+                    reverse_name,
+                    {'cursor': second_page.previous_cursor}
+                ).context['page_obj']
+                self.assertEqual(list(back_page), expected[:10])
+
+    def test_cursor_pages_without_count_and_offset(self):
+        """Курсорная страница не выполняет COUNT и OFFSET."""
+        first_page = self.guest_client.get(
+            reverse('posts:index'), {'cursor': ''}).context['page_obj']
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.guest_client.get(
+                reverse('posts:index'), {'cursor': first_page.next_cursor})
+        self.assertContains(response, '?cursor=')
+        for query in queries.captured_queries:
+            self.assertNotIn('COUNT(', query['sql'])
+            self.assertNotIn('OFFSET', query['sql'])
+
+    def test_broken_cursor_shows_first_page(self):
+        """Некорректный курсор открывает первую страницу."""
+        null_values = base64.urlsafe_b64encode(
+            json.dumps(['n', [None, None]]).encode()).decode()
+        bad_date = base64.urlsafe_b64encode(
+            json.dumps(['n', ['вчера', 1]]).encode()).decode()
+        for cursor in ('broken', null_values, bad_date):
+            with self.subTest(cursor=cursor):
+                response = self.guest_client.get(reverse('posts:index'),
+                                                 {'cursor': cursor})
+                page_obj = response.context['page_obj']
+                self.assertEqual(len(page_obj), 10)
+                self.assertFalse(page_obj.has_previous())
+
+
+class ListQueriesTest(TestCase):
+    """Число запросов страниц списков не зависит от числа постов."""
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(
+            first_name='Brick',
+            last_name='Top',
+            username='Brick_Top')
+        cls.reader = User.objects.create_user(username='Reader')
+        cls.group = Group.objects.create(
+            title='группа',
+            description='описание группы',
+            slug='test-slug')
+        Follow.objects.create(user=cls.reader, author=cls.user)
+        cls.create_posts(2)
+
+    @classmethod
+    def create_posts(cls, count):
+        for number in range(count):
+            Post.objects.create(text=f'Текст {number}',
+                                author=cls.user,
+                                group=cls.group)
+
+    def setUp(self):
+        self.guest_client = Client()
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+        cache.clear()
+
+    def test_list_pages_query_count(self):
+        """Списки постов выполняют фиксированное число запросов."""
+        pages = {
+            reverse('posts:index'): (self.guest_client, 2),
+            reverse('posts:group_list', kwargs={'slug': self.group.slug}):
+                (self.guest_client, 4),
+            reverse('posts:profile', kwargs={'username': self.user.username}):
+                (self.guest_client, 4),
+            reverse('posts:follow_index'): (self.reader_client, 5),
+        }
+        for url, (client, _) in pages.items():
+            client.get(url)
+        self.create_posts(12)
+        for url, (client, queries) in pages.items():
+            with self.subTest(url=url):
+                client.get(url)
+                cache.clear()
+                with self.assertNumQueries(queries):
+                    client.get(url)
+
+
+class CommentsPageTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='Doug_The_Head')
+        cls.post = Post.objects.create(text='Популярный пост', author=cls.user)
+        for number in range(25):
+            Comment.objects.create(
+                post=cls.post,
+                author=User.objects.create_user(username=f'fan_{number}'),
+                text=f'Комментарий {number}',
+            )
+        cls.URL_POST_DETAIL = reverse('posts:post_detail',
+                                      kwargs={'post_id': cls.post.id})
+        cls.URL_COMMENTS = reverse('posts:post_comments',
+                                   kwargs={'post_id': cls.post.id})
+
+    def setUp(self):
+        self.guest_client = Client()
+        cache.clear()
+
+    def test_post_detail_comments_query_count(self):
+        """Первая страница комментариев стоит фиксированного числа
+        запросов."""
+        self.guest_client.get(self.URL_POST_DETAIL)
+        # Мимо кеша страниц для анонимных посетителей
+        purge(post_tag(self.post.pk))
+        with self.assertNumQueries(4):
+            response = self.guest_client.get(self.URL_POST_DETAIL)
+        comments = response.context['comments']
+        self.assertEqual(len(comments), 20)
+        self.assertEqual(comments[0].text, 'Комментарий 0')
+        self.assertTrue(comments.has_next())
+
+    def test_load_more_comments(self):
+        """Остальные комментарии подгружаются по курсору."""
+        comments = self.guest_client.get(
+            self.URL_POST_DETAIL).context['comments']
+        response = self.guest_client.get(
+            self.URL_COMMENTS, {'cursor': comments.next_cursor})
+        next_comments = response.context['comments']
+        self.assertEqual(
+            [comment.text for comment in next_comments],
+            [f'Комментарий {number}' for number in range(20, 25)]
+        )
+        self.assertFalse(next_comments.has_next())
+        self.assertTemplateNotUsed(response, 'base.html')
+
+    def test_comments_of_missing_post(self):
+        """Комментарии несуществующего или удалённого поста — 404, как и
+        страница самого поста."""
+        post = Post.objects.create(text='Удалённый пост', author=self.user)
+        url = reverse('posts:post_comments', kwargs={'post_id': post.id})
+        post.delete()
+        self.assertEqual(self.guest_client.get(url).status_code, 404)
+
+    def test_newest_comments_first(self):
+        """С order=new комментарии идут от новых к старым."""
+        response = self.guest_client.get(self.URL_POST_DETAIL,
+                                         {'order': 'new'})
+        self.assertEqual(response.context['comments'][0].text,
+                         'Комментарий 24')
+
+
+@override_settings(THUMBNAIL_WORKERS=0)
+class ThumbnailPipelineTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.media_root = tempfile.mkdtemp(dir=settings.BASE_DIR)
+        cls.media_settings = override_settings(MEDIA_ROOT=cls.media_root)
+        cls.media_settings.enable()
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='Gorgeous_George')
+        cls.post = Post.objects.create(
+            text='Пост с картинкой',
+            author=cls.user,
+            image=SimpleUploadedFile(
+                name='thumb.gif',
+                content=(
+                    b'\x47\x49\x46\x38\x39\x61\x01\x00'
+                    b'\x01\x00\x00\x00\x00\x21\xf9\x04'
+                    b'\x01\x0a\x00\x01\x00\x2c\x00\x00'
+                    b'\x00\x00\x01\x00\x01\x00\x00\x02'
+                    b'\x02\x4c\x01\x00\x3b'
+                ),
+                content_type='image/gif'
+            ),
+        )
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        cls.media_settings.disable()
+        shutil.rmtree(cls.media_root, ignore_errors=True)
+
+    def setUp(self):
+        self.guest_client = Client()
+        cache.clear()
+
+    @override_settings(THUMBNAIL_WORKERS=2)
+    def test_placeholder_until_thumbnail_ready(self):
+        """Пока миниатюры нет, выводится заглушка, после построения —
+        картинка."""
+        url = reverse('posts:index')
+        with mock.patch('posts.thumbnails.schedule_after_commit') as schedule:
+            response = self.guest_client.get(url)
+        schedule.assert_called_with(self.post.image.name)
+        self.assertContains(response, 'aspect-ratio')
+        self.assertNotContains(response, 'class="card-img my-2" src=')
+        thumbnails.generate(self.post.image.name)
+        cache.clear()
+        self.assertIsNotNone(
+            thumbnails.get_ready_thumbnail(self.post.image, 'post'))
+        response = self.guest_client.get(url)
+        self.assertContains(response, 'class="card-img my-2" src=')
+
+    @override_settings(THUMBNAIL_WORKERS=2)
+    def test_request_does_not_wait_for_pool(self):
+        """Ответ отдаётся, пока миниатюра ещё строится в пуле."""
+        for name in thumbnails.GEOMETRIES:
+            _, thumbnail, _, _ = thumbnails.resolve(self.post.image, name)
+            thumbnail.delete()
+        release = threading.Event()
+        generate = thumbnails.generate
+
+        def slow_generate(image_name):
+            release.wait(5)
+            generate(image_name)
+
+        with mock.patch('posts.thumbnails.generate',
+                        side_effect=slow_generate), \
+                mock.patch('django.db.transaction.on_commit',
+                           side_effect=lambda func: func()):
+            response = self.guest_client.get(reverse('posts:index'))
+            self.assertEqual(response.status_code, 200)
+            self.assertTrue(thumbnails._jobs)
+            release.set()
+            thumbnails.flush()
+        self.assertFalse(thumbnails._jobs)
+        self.assertIsNotNone(
+            thumbnails.get_ready_thumbnail(self.post.image, 'post'))
+
+
+class AnonymousPageCacheTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.group = Group.objects.create(title='Группа', slug='group')
+        cls.other_group = Group.objects.create(title='Другая', slug='other')
+        cls.post = Post.objects.create(text='Пост', author=cls.author,
+                                       group=cls.group)
+
+    def setUp(self):
+        cache.clear()
+        self.group_url = reverse('posts:group_list', args=['group'])
+        self.other_url = reverse('posts:group_list', args=['other'])
+
+    def test_repeated_request_without_queries(self):
+        """Повторный запрос гостя не обращается к базе, посторонние
+        параметры запроса не создают новой записи."""
+        self.client.get(self.group_url)
+        with self.assertNumQueries(0):
+            response = self.client.get(self.group_url, {'utm_source': 'x'})
+        self.assertContains(response, 'Пост')
+
+    def test_page_number_in_key(self):
+        self.client.get(self.group_url)
+        with self.assertNumQueries(0):
+            self.client.get(self.group_url)
+        response = self.client.get(self.group_url, {'page': 2})
+        self.assertIsNotNone(response.context)
+
+    def test_new_post_purges_only_tagged_pages(self):
+        self.client.get(self.group_url)
+        self.client.get(self.other_url)
+        Post.objects.create(text='Новый пост', author=self.author,
+                            group=self.group)
+        self.assertContains(self.client.get(self.group_url), 'Новый пост')
+        with self.assertNumQueries(0):
+            self.client.get(self.other_url)
+
+    def test_edit_purges_pages_with_post(self):
+        url = reverse('posts:post_detail', args=[self.post.pk])
+        self.client.get(url)
+        self.client.get(self.group_url)
+        post = Post.objects.get(pk=self.post.pk)
+        post.text = 'Исправленный пост'
+        post.save()
+        for url in (url, self.group_url):
+            with self.subTest(url=url):
+                self.assertContains(self.client.get(url),
+                                    'Исправленный пост')
+
+    def test_authorized_user_not_served_from_cache(self):
+        self.client.get(self.group_url)
+        self.client.force_login(self.author)
+        response = self.client.get(self.group_url)
+        self.assertIsNotNone(response.context)
@@ -0,0 +1,154 @@
+"""Фоновая подготовка миниатюр картинок постов.
+
+Миниатюры известных размеров строятся в пуле потоков после сохранения
+поста, а шаблоны выводят только готовые миниатюры (см. тег
+ready_thumbnail) и заглушку, пока миниатюра не построена. Так первый
+запрос к странице со свежими картинками не ждёт Pillow.
+
+Готовность миниатюры определяется по наличию её файла, а не по
+хранилищу ключей sorl: так вывод списка не делает запрос к базе на
+каждую картинку, а фоновый поток вообще не обращается к базе. Запрос
+не ждёт пул: задачи выполняются, пока воркер обслуживает следующие
+запросы, а оставшиеся дожидаются только при выходе процесса (flush).
+"""
+import atexit
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from django.conf import settings
+from django.db import transaction
+from sorl.thumbnail import default
+from sorl.thumbnail.conf import defaults as sorl_defaults
+from sorl.thumbnail.conf import settings as sorl_settings
+from sorl.thumbnail.images import ImageFile
+
+from core.anonymous_cache import purge
+from core.page_cache import bump_generation
+
+from .cards import bump_version, image_version_key
+from .page_tags import image_tag
+
+logger = logging.getLogger(__name__)
+
+# Миниатюры, которые выводят шаблоны: список постов и страница поста
+# показывают картинку одного размера, поэтому миниатюра у них общая
+GEOMETRIES = {
+    'post': ('960x339', {'crop': 'center', 'upscale': True}),
+}
+
+_executor = None
+_executor_lock = threading.Lock()
+# Картинки, миниатюры которых строятся или ждут в очереди, и задачи пула
+_pending = set()
+_jobs = set()
+_jobs_lock = threading.Lock()
+
+
+def get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.THUMBNAIL_WORKERS,
+                thread_name_prefix='thumbnails',
+            )
+        return _executor
+
+
+def resolve(image, name):
+    """Исходник, файл миниатюры, геометрия и опции размера name.
+
+    Повторяет подготовку опций из ThumbnailBackend.get_thumbnail, чтобы
+    имена файлов совпадали с теми, что строит сам sorl.
+    """
+    geometry, options = GEOMETRIES[name]
+    options = dict(options)
+    backend = default.backend
+    source = ImageFile(image)
+    if sorl_settings.THUMBNAIL_PRESERVE_FORMAT:
+        options.setdefault('format', backend._get_format(source))
+    for key, value in backend.default_options.items():
+        options.setdefault(key, value)
+    for key, attr in backend.extra_options:
+        value = getattr(sorl_settings, attr)
+        if value != getattr(sorl_defaults, attr):
+            options.setdefault(key, value)
+    thumbnail = ImageFile(
+        backend._get_thumbnail_filename(source, geometry, options),
+        default.storage,
+    )
+    return source, thumbnail, geometry, options
+
+
+def get_ready_thumbnail(image, name):
+    """Готовая миниатюра размера name или None, если её ещё нет."""
+    _, thumbnail, _, _ = resolve(image, name)
+    if thumbnail.exists():
+        return thumbnail
+    return None
+
+
+def generate(image_name):
+    """Строит файлы всех известных миниатюр картинки."""
+    try:
+        for name in GEOMETRIES:
+            source, thumbnail, geometry, options = resolve(image_name, name)
+            if not source.exists() or thumbnail.exists():
+                continue
+            source_image = default.engine.get_image(source)
+            try:
+                options['image_info'] = default.engine.get_image_info(
+                    source_image)
+                default.backend._create_thumbnail(
+                    source_image, geometry, options, thumbnail)
+            finally:
+                default.engine.cleanup(source_image)
+    except Exception:
+        logger.exception('Не удалось построить миниатюры %s', image_name)
+    finally:
+        with _jobs_lock:
+            _pending.discard(image_name)
+
+
+def generate_in_worker(image_name):
+    generate(image_name)
+    # Пока миниатюры строились, в кеш страниц и карточек могли попасть
+    # страницы и карточки с заглушкой
+    bump_version(image_version_key(image_name))
+    bump_generation()
+    purge(image_tag(image_name))
+
+
+def schedule(image_name):
+    """Ставит построение миниатюр в очередь, если оно ещё не запущено."""
+    with _jobs_lock:
+        if image_name in _pending:
+            return
+        _pending.add(image_name)
+    if not settings.THUMBNAIL_WORKERS:
+        generate(image_name)
+        return
+    future = get_executor().submit(generate_in_worker, image_name)
+    with _jobs_lock:
+        _jobs.add(future)
+    future.add_done_callback(forget_job)
+
+
+def forget_job(future):
+    with _jobs_lock:
+        _jobs.discard(future)
+
+
+def flush():
+    """Дожидается всех поставленных в очередь миниатюр."""
+    with _jobs_lock:
+        jobs = list(_jobs)
+    wait(jobs)
+
+
+atexit.register(flush)
+
+
+def schedule_after_commit(image_name):
+    transaction.on_commit(lambda: schedule(image_name))
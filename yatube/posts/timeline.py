@@ -0,0 +1,194 @@
+"""Материализованные ленты подписок (fan-out on write).
+
+Лента пользователя хранится в таблице Timeline и пополняется в момент
+публикации поста или подписки на автора, поэтому страница подписок
+читается одним запросом по индексу (user, -created) вместо соединения
+Post с Follow.
+
+Авторы, у которых подписчиков не меньше FEED_PULL_THRESHOLD, в ленты
+не раскладываются: их посты подтягиваются при чтении и сливаются с
+лентой k-путевым слиянием (гибридная схема push/pull).
+"""
+import heapq
+import math
+from itertools import islice
+
+from django.conf import settings
+from django.db import connections, router, transaction
+from django.db.models import Count, F, OuterRef, Subquery
+
+from core.query_budget import allow_queries
+
+from .models import Follow, Post, Timeline
+
+FEED_ORDERING = ('-created', '-id')
+
+
+def followers_count(author_id):
+    return Follow.objects.filter(author_id=author_id).count()
+
+
+def is_pulled(followers):
+    """Посты автора с таким числом подписчиков читаются при запросе."""
+    return followers >= settings.FEED_PULL_THRESHOLD
+
+
+def push_post(post):
+    """Раскладывает новый пост по лентам подписчиков автора."""
+    if is_pulled(followers_count(post.author_id)):
+        return
+    followers = Follow.objects.filter(
+        author_id=post.author_id
+    ).values_list('user_id', flat=True)
+    bulk_add(
+        Timeline(user_id=user_id, post_id=post.id, created=post.created)
+        for user_id in followers.iterator()
+    )
+
+
+def add_author(user_id, author_id):
+    """Добавляет в ленту пользователя все посты автора."""
+    posts = Post.objects.filter(
+        author_id=author_id
+    ).values_list('id', 'created')
+    bulk_add(
+        Timeline(user_id=user_id, post_id=post_id, created=created)
+        for post_id, created in posts.iterator()
+    )
+
+
+def bulk_add(entries):
+    """Вставляет записи лент; вставка идёт пакетами, и каждый пакет
+    сверх первого расширяет бюджет запросов представления."""
+    entries = list(entries)
+    connection = connections[router.db_for_write(Timeline)]
+    fields = [Timeline._meta.get_field(name)
+              for name in ('user', 'post', 'created')]
+    batch_size = max(connection.ops.bulk_batch_size(fields, entries), 1)
+    allow_queries(max(math.ceil(len(entries) / batch_size) - 1, 0))
+    Timeline.objects.bulk_create(
+        entries, batch_size=batch_size, ignore_conflicts=True)
+
+
+def remove_author(user_id, author_id):
+    """Убирает из ленты пользователя посты автора."""
+    Timeline.objects.filter(
+        user_id=user_id,
+        post__author_id=author_id,
+    ).delete()
+
+
+def follow(user_id, author_id):
+    """Обновляет ленты после новой подписки."""
+    followers = followers_count(author_id)
+    if not is_pulled(followers):
+        add_author(user_id, author_id)
+    elif not is_pulled(followers - 1):
+        # Автор только что перешёл порог: его посты больше не хранятся
+        # в лентах и будут читаться при запросе.
+        Timeline.objects.filter(post__author_id=author_id).delete()
+
+
+def unfollow(user_id, author_id):
+    """Обновляет ленты после отписки."""
+    remove_author(user_id, author_id)
+    followers = followers_count(author_id)
+    if is_pulled(followers + 1) and not is_pulled(followers):
+        # Автор опустился ниже порога: раскладываем его посты обратно.
+        subscribers = Follow.objects.filter(
+            author_id=author_id
+        ).values_list('user_id', flat=True)
+        for subscriber_id in subscribers.iterator():
+            # Чтение постов автора и первый пакет вставки
+            allow_queries(2)
+            add_author(subscriber_id, author_id)
+
+
+def rebuild_timelines():
+    """Пересобирает все ленты по текущему графу подписок."""
+    with transaction.atomic():
+        Timeline.objects.all().delete()
+        follows = Follow.objects.values_list('user_id', 'author_id')
+        pulled = set(pulled_authors(Follow.objects.all()))
+        for user_id, author_id in follows.iterator():
+            if author_id not in pulled:
+                add_author(user_id, author_id)
+    return Timeline.objects.count()
+
+
+def pulled_authors(follows):
+    """Авторы из набора подписок, которые читаются при запросе."""
+    followers = Follow.objects.filter(
+        author=OuterRef('author')
+    ).order_by().values('author').annotate(total=Count('pk')).values('total')
+    return follows.annotate(
+        followers=Subquery(followers)
+    ).filter(
+        followers__gte=settings.FEED_PULL_THRESHOLD
+    ).values_list('author_id', flat=True).distinct()
+
+
+def get_feed(user):
+    """Посты из ленты подписок пользователя, новые сверху.
+
+    Обе колонки сортировки берутся из Timeline, чтобы страница читалась
+    по индексу (user, -created, -post) без сортировки.
+    """
+    return Post.objects.for_list().filter(
+        timeline_entries__user=user
+    ).order_by(
+        '-timeline_entries__created',
+        F('timeline_entries__post').desc(),
+    )
+
+
+class HybridFeed:
+    """Лента, собранная из материализованной части и постов
+    популярных авторов.
+
+    Каждый источник упорядочен по (created, id), поэтому срез ленты
+    получается слиянием heapq.merge первых stop записей каждого
+    источника. Объект подходит для передачи в Paginator.
+    """
+
+    def __init__(self, user, pulled):
+        # Каждый источник читается двумя запросами: число и срез
+        allow_queries(2 * len(pulled))
+        self.pushed = get_feed(user).exclude(author_id__in=pulled)
+        self.pulled = [
+            Post.objects.for_list().filter(
+                author_id=author_id
+            ).order_by(*FEED_ORDERING)
+            for author_id in pulled
+        ]
+
+    @property
+    def streams(self):
+        return [self.pushed, *self.pulled]
+
+    def count(self):
+        return sum(stream.count() for stream in self.streams)
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, key):
+        if not isinstance(key, slice):
+            return self[key:key + 1][0]
+        start, stop = key.start or 0, key.stop
+        if stop is None:
+            stop = self.count()
+        merged = heapq.merge(
+            *(stream[:stop] for stream in self.streams),
+            key=lambda post: (post.created, post.id),
+            reverse=True,
+        )
+        return list(islice(merged, start, stop))
+
+
+def get_follow_feed(user):
+    """Лента подписок пользователя с учётом гибридной схемы."""
+    pulled = list(pulled_authors(user.follower.all()))
+    if not pulled:
+        return get_feed(user)
+    return HybridFeed(user, pulled)
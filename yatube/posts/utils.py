@@ -1,8 +1,233 @@
+import base64
+import json
+import math
+
+from django.conf import settings
+from django.core.exceptions import FieldDoesNotExist, ValidationError
 from django.core.paginator import Paginator
+from django.db.models import Q, QuerySet
+from django.utils.functional import cached_property
+
+CURSOR_ORDERING = ('-created', '-id')
 
 
-def get_page_context(queryset, request, count_post=10):
-    paginator = Paginator(queryset, count_post)
+def get_page_context(queryset, request, count_post=10, count=None):
+    """Страница списка. count — готовое число записей или функция,
+    которая его вернёт; без него Paginator выполняет COUNT(*)."""
+    if use_cursor_pagination(queryset, request):
+        return get_cursor_page_context(queryset, request, count_post)
+    if count is None:
+        paginator = WindowedPaginator(queryset, count_post)
+    else:
+        paginator = CountedPaginator(queryset, count_post, count)
     page_number = request.GET.get('page')
     page_obj = paginator.get_page(page_number)
     return page_obj
+
+
+class WindowedPaginator(Paginator):
+    """Paginator, страницы которого выводят не все номера страниц.
+
+    В page_window страницы лежит окно номеров: первые и последние on_ends
+    номеров и on_each_side номеров вокруг текущей страницы, пропуски
+    обозначены None. Размер окна не зависит от числа страниц.
+    """
+    on_each_side = 2
+    on_ends = 1
+
+    def _get_page(self, object_list, number, paginator):
+        page = super()._get_page(object_list, number, paginator)
+        page.page_window = self.get_page_window(number)
+        return page
+
+    def get_page_window(self, number):
+        window_size = 2 * (self.on_each_side + self.on_ends) + 1
+        if self.num_pages <= window_size + 2:
+            return list(self.page_range)
+        start = max(number - self.on_each_side, 1)
+        end = min(number + self.on_each_side, self.num_pages)
+        window = list(range(start, end + 1))
+        if start > self.on_ends + 2:
+            window = [*range(1, self.on_ends + 1), None, *window]
+        else:
+            window = [*range(1, start), *window]
+        last_end = self.num_pages - self.on_ends + 1
+        if end < last_end - 2:
+            window += [None, *range(last_end, self.num_pages + 1)]
+        else:
+            window += range(end + 1, self.num_pages + 1)
+        return window
+
+
+class CountedPaginator(WindowedPaginator):
+    """Paginator, который берёт число записей из счётчика."""
+
+    def __init__(self, object_list, per_page, count, **kwargs):
+        super().__init__(object_list, per_page, **kwargs)
+        self._count = count
+
+    @cached_property
+    def count(self):
+        if callable(self._count):
+            return self._count()
+        return self._count
+
+
+def use_cursor_pagination(queryset, request):
+    """Курсорная пагинация включается настройкой или параметром cursor."""
+    if not isinstance(queryset, QuerySet):
+        return False
+    return settings.POSTS_CURSOR_PAGINATION or 'cursor' in request.GET
+
+
+def get_cursor_page_context(queryset, request, count_post=10,
+                            ordering=CURSOR_ORDERING):
+    paginator = CursorPaginator(queryset, count_post, ordering)
+    return paginator.get_page(request.GET.get('cursor'))
+
+
+class CursorPage:
+    """Страница курсорной пагинации.
+
+    В отличие от django.core.paginator.Page не знает ни своего номера,
+    ни общего числа страниц, зато отдаёт курсоры соседних страниц.
+    """
+    cursor_pagination = True
+
+    def __init__(self, object_list, paginator, next_cursor=None,
+                 previous_cursor=None):
+        self.object_list = object_list
+        self.paginator = paginator
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __repr__(self):
+        return f'<CursorPage of {len(self)} objects>'
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+class CursorPaginator:
+    """Пагинация по ключу (keyset) без OFFSET и COUNT.
+
+    Страница выбирается условием «строго после/до граничной записи»
+    по полям ordering, которые должны однозначно упорядочивать выборку.
+    Курсор — это значения этих полей у граничной записи и направление,
+    упакованные в base64. Кроме полей модели в ordering можно указать
+    числовые аннотации queryset.
+    """
+    NEXT = 'n'
+    PREVIOUS = 'p'
+
+    def __init__(self, queryset, per_page, ordering=CURSOR_ORDERING):
+        self.queryset = queryset
+        self.per_page = int(per_page)
+        self.ordering = ordering
+        self.fields = [field.lstrip('-') for field in ordering]
+
+    def get_page(self, cursor=None):
+        """Возвращает страницу по курсору, неверный курсор — первая
+        страница."""
+        direction, values = self.NEXT, None
+        if cursor:
+            try:
+                direction, values = self.decode_cursor(cursor)
+            except (TypeError, ValueError, ValidationError):
+                pass
+        if direction == self.PREVIOUS:
+            rows = list(self.queryset.filter(
+                self.boundary(values, reverse=True)
+            ).order_by(*self.reversed_ordering)[:self.per_page + 1])
+            has_more = len(rows) > self.per_page
+            rows = rows[:self.per_page][::-1]
+            has_previous, has_next = has_more, True
+        else:
+            queryset = self.queryset.order_by(*self.ordering)
+            if values is not None:
+                queryset = queryset.filter(self.boundary(values))
+            rows = list(queryset[:self.per_page + 1])
+            has_next = len(rows) > self.per_page
+            rows = rows[:self.per_page]
+            has_previous = values is not None
+        next_cursor = previous_cursor = None
+        if rows and has_next:
+            next_cursor = self.encode_cursor(self.NEXT, rows[-1])
+        if rows and has_previous:
+            previous_cursor = self.encode_cursor(self.PREVIOUS, rows[0])
+        return CursorPage(rows, self, next_cursor, previous_cursor)
+
+    @property
+    def reversed_ordering(self):
+        return [
+            field[1:] if field.startswith('-') else f'-{field}'
+            for field in self.ordering
+        ]
+
+    def boundary(self, values, reverse=False):
+        """Условие «запись идёт после values» в порядке ordering."""
+        condition = Q()
+        for position, field in enumerate(self.ordering):
+            descending = field.startswith('-') != reverse
+            lookup = 'lt' if descending else 'gt'
+            name = self.fields[position]
+            exact = {
+                self.fields[index]: values[index] for index in range(position)
+            }
+            condition |= Q(**exact, **{f'{name}__{lookup}': values[position]})
+        return condition
+
+    def get_field(self, name):
+        """Поле модели или None для аннотации."""
+        try:
+            return self.queryset.model._meta.get_field(name)
+        except FieldDoesNotExist:
+            return None
+
+    def encode_cursor(self, direction, obj):
+        values = []
+        for name in self.fields:
+            field = self.get_field(name)
+            if field is None:
+                values.append(getattr(obj, name))
+            else:
+                values.append(field.value_to_string(obj))
+        payload = json.dumps([direction, values]).encode()
+        return base64.urlsafe_b64encode(payload).decode()
+
+    def decode_cursor(self, cursor):
+        payload = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        direction, raw_values = payload
+        if direction not in (self.NEXT, self.PREVIOUS):
+            raise ValueError('Неизвестное направление курсора')
+        if len(raw_values) != len(self.fields):
+            raise ValueError('Курсор не соответствует сортировке')
+        values = []
+        for name, value in zip(self.fields, raw_values):
+            # Сравнение с NULL в условии границы недопустимо
+            if value is None:
+                raise ValueError('Пустое значение в курсоре')
+            field = self.get_field(name)
+            if field is None:
+                value = float(value)
+                if not math.isfinite(value):
+                    raise ValueError('Неверное значение в курсоре')
+                values.append(value)
+            else:
+                values.append(field.clean(value, None))
+        return direction, values
@@ -1,16 +1,39 @@
 from django.shortcuts import render, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.shortcuts import redirect
-from django.views.decorators.cache import cache_page
-from .utils import get_page_context
-from .models import Post, Group, User, Follow
-from .forms import PostForm, CommentForm
+from django.conf import settings
 
+from core import object_cache
+from core.page_cache import cache_page_versioned
+from core.query_budget import query_budget
+from core.replicas import read_from_replica
 
-@cache_page(20, key_prefix='index_page')
+from . import counters
+from .conditional import (
+    conditional_page, group_state, post_detail_state, profile_state
+)
+from .page_tags import INDEX_TAG, group_tag, tag_posts, user_tag
+from .utils import get_cursor_page_context, get_page_context
+from .models import Comment, Post, Group, User, Follow
+from .forms import CommentForm, PostForm, SearchForm
+from .search import SEARCH_ORDERING, search_posts
+from .timeline import get_follow_feed
+
+COMMENTS_PER_PAGE = 20
+COMMENTS_ORDERING = {
+    'old': ('created', 'id'),
+    'new': ('-created', '-id'),
+}
+
+
+@query_budget(7)
+@read_from_replica
+@cache_page_versioned(settings.PAGE_CACHE_TIMEOUT, key_prefix='index_page')
 def index(request):
-    posts = Post.objects.all()
-    page_obj = get_page_context(posts, request)
+    posts = Post.objects.for_list()
+    page_obj = get_page_context(posts, request,
+                                count=counters.posts_count)
+    tag_posts(request, page_obj, INDEX_TAG)
     context = {
         'page_obj': page_obj,
         'title': 'Последние обновления на сайте'
@@ -19,10 +42,17 @@ def index(request):
     return render(request, template, context)
 
 
+@query_budget(9)
+@read_from_replica
+@conditional_page(group_state)
+@cache_page_versioned(settings.PAGE_CACHE_TIMEOUT, key_prefix='group_page')
 def group_posts(request, slug):
-    group = get_object_or_404(Group, slug=slug)
-    posts = group.grouped_posts.all()
-    page_obj = get_page_context(posts, request)
+    group = object_cache.get_object_or_404(Group, slug=slug)
+    posts = group.grouped_posts.for_list()
+    page_obj = get_page_context(
+        posts, request, count=lambda: counters.group_posts_count(group)
+    )
+    tag_posts(request, page_obj, group_tag(group.pk))
     context = {
         'group': group,
         'page_obj': page_obj,
@@ -32,10 +62,16 @@ def group_posts(request, slug):
     return render(request, template, context)
 
 
+@query_budget(10)
+@read_from_replica
+@conditional_page(profile_state)
+@cache_page_versioned(settings.PAGE_CACHE_TIMEOUT, key_prefix='profile_page')
 def profile(request, username):
-    username = get_object_or_404(User, username=username)
-    posts_user = Post.objects.filter(author=username)
-    page_obj = get_page_context(posts_user, request)
+    username = object_cache.get_object_or_404(User, username=username)
+    posts_user = Post.objects.for_list().filter(author=username)
+    posts_count = counters.author_posts_count(username)
+    page_obj = get_page_context(posts_user, request, count=posts_count)
+    tag_posts(request, page_obj, user_tag(username.pk))
     following = False
     if request.user.is_authenticated:
         following = request.user.follower.filter(author=username).exists()
@@ -43,28 +79,93 @@ def profile(request, username):
         'title': f'{username.get_full_name()} профайл пользователя',
         'author': username,
         'page_obj': page_obj,
+        'posts_count': posts_count,
         'following': following,
     }
     template = 'posts/profile.html'
     return render(request, template, context)
 
 
+@query_budget(9)
+@read_from_replica
+@conditional_page(post_detail_state)
 def post_detail(request, post_id):
-    post = get_object_or_404(Post, id=post_id)
-    posts_count = Post.objects.filter(author=post.author).count()
-    comments = post.comments.all()
+    post = get_object_or_404(
+        Post.objects.select_related('author', 'group'), id=post_id
+    )
+    posts_count = counters.author_posts_count(post.author)
+    comments = get_comments_page(request, post.id)
+    tag_posts(request, [post], *(
+        user_tag(comment.author_id) for comment in comments.object_list))
     form = CommentForm(request.POST or None)
     context = {
         'title': 'Пост ' + post.text[:30],
         'post': post,
         'posts_count': posts_count,
         'form': form,
-        'comments': comments
+        'comments': comments,
+        'comments_order': get_comments_order(request),
     }
     template = 'posts/post_detail.html'
     return render(request, template, context)
 
 
+@query_budget(3)
+@read_from_replica
+def post_comments(request, post_id):
+    """Следующая порция комментариев к посту в виде HTML-фрагмента."""
+    get_object_or_404(Post.objects.only('pk'), pk=post_id)
+    context = {
+        'post_id': post_id,
+        'comments': get_comments_page(request, post_id),
+        'comments_order': get_comments_order(request),
+    }
+    template = 'posts/includes/comments.html'
+    return render(request, template, context)
+
+
+@query_budget(4)
+@read_from_replica
+def search(request):
+    form = SearchForm(request.GET or None)
+    page_obj = None
+    if form.is_valid():
+        posts = search_posts(
+            form.cleaned_data['q'],
+            group=form.cleaned_data['group'],
+            author=form.cleaned_data['author'],
+        )
+        page_obj = get_cursor_page_context(
+            posts, request, ordering=SEARCH_ORDERING
+        )
+    params = request.GET.copy()
+    params.pop('cursor', None)
+    context = {
+        'form': form,
+        'page_obj': page_obj,
+        'page_query': params.urlencode(),
+        'title': 'Поиск по записям',
+    }
+    template = 'posts/search.html'
+    return render(request, template, context)
+
+
+def get_comments_order(request):
+    return 'new' if request.GET.get('order') == 'new' else 'old'
+
+
+def get_comments_page(request, post_id):
+    """Страница комментариев с авторами, от старых к новым или наоборот."""
+    comments = Comment.objects.filter(post_id=post_id).select_related(
+        'author'
+    ).only('id', 'text', 'created', 'post', 'author', 'author__username')
+    ordering = COMMENTS_ORDERING[get_comments_order(request)]
+    return get_cursor_page_context(
+        comments, request, COMMENTS_PER_PAGE, ordering
+    )
+
+
+@query_budget(8)
 @login_required
 def post_create(request):
     template = 'posts/create_post.html'
@@ -84,6 +185,7 @@ def post_create(request):
     return render(request, template, context)
 
 
+@query_budget(8)
 @login_required
 def post_edit(request, post_id):
     post = get_object_or_404(Post, id=post_id)
@@ -106,6 +208,7 @@ def post_edit(request, post_id):
     return render(request, template, context)
 
 
+@query_budget(5)
 @login_required
 def add_comment(request, post_id):
     post = get_object_or_404(Post, id=post_id)
@@ -118,22 +221,24 @@ def add_comment(request, post_id):
     return redirect('posts:post_detail', post_id=post_id)
 
 
+@query_budget(7)
+@read_from_replica
 @login_required
 def follow_index(request):
-    posts = Post.objects.select_related(
-        'author', 'group').filter(
-            author__following__user=request.user
-    ).prefetch_related('comments')
-    page_obj = get_page_context(posts, request)
+    posts = get_follow_feed(request.user)
+    page_obj = get_page_context(
+        posts, request, count=lambda: counters.feed_count(request.user, posts)
+    )
     context = {'page_obj': page_obj}
     template = 'posts/follow.html'
     return render(request, template, context)
 
 
+@query_budget(9)
 @login_required
 def profile_follow(request, username):
     follower = request.user
-    author = get_object_or_404(User, username=username)
+    author = object_cache.get_object_or_404(User, username=username)
     if follower != author:
         Follow.objects.get_or_create(user=follower, author=author)
     previous_path = request.META.get('HTTP_REFERER')
@@ -141,10 +246,11 @@ def profile_follow(request, username):
                     username)
 
 
+@query_budget(8)
 @login_required
 def profile_unfollow(request, username):
     follower = request.user
-    author = get_object_or_404(User, username=username)
+    author = object_cache.get_object_or_404(User, username=username)
     follower.follower.filter(author=author).delete()
     previous_path = request.META.get('HTTP_REFERER')
     return redirect(previous_path if previous_path else 'posts:profile',
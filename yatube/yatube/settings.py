@@ -50,7 +50,11 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.metrics.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'core.replicas.ReplicaPinMiddleware',
+    'core.anonymous_cache.AnonymousPageCacheMiddleware',
+    'core.surrogate.SurrogateKeyMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -64,9 +68,13 @@ ROOT_URLCONF = 'yatube.urls'
 
 TEMPLATES_DIR = os.path.join(BASE_DIR, 'templates')
 
+# В боевом режиме шаблоны компилируются один раз при запуске процесса
+# (см. core.template_cache) и отдаются из памяти
+TEMPLATES_PRECOMPILE = not DEBUG
+
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'BACKEND': 'core.metrics.TimedDjangoTemplates',
         'DIRS': [TEMPLATES_DIR],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -81,6 +89,15 @@ TEMPLATES = [
     },
 ]
 
+if TEMPLATES_PRECOMPILE:
+    TEMPLATES[0]['APP_DIRS'] = False
+    TEMPLATES[0]['OPTIONS']['loaders'] = [
+        ('django.template.loaders.cached.Loader', [
+            'django.template.loaders.filesystem.Loader',
+            'django.template.loaders.app_directories.Loader',
+        ]),
+    ]
+
 WSGI_APPLICATION = 'yatube.wsgi.application'
 
 
@@ -91,8 +108,18 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
-    }
+    },
+    # Локальная реплика: копия основной базы, которую обновляет команда
+    # replicate_db. В тестах подменяется основной базой
+    'replica': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.path.join(BASE_DIR, 'db_replica.sqlite3'),
+        'TEST': {'MIRROR': 'default'},
+    },
 }
+
+DATABASE_ROUTERS = ['core.replicas.ReplicaRouter']
+
 # Password validation
 # https://docs.djangoproject.com/en/2.2/ref/settings/#auth-password-validators
 
@@ -154,6 +181,145 @@ CACHES = {
     }
 }
 
+# В боевом режиме кеш один на все процессы хоста: файл SQLite с
+# вытеснением давно не читанных записей сверх MAX_SIZE байт (см.
+# core.sqlite_cache). В разработке и тестах хватает памяти процесса
+if not DEBUG:
+    CACHES['default'] = {
+        'BACKEND': 'core.sqlite_cache.SQLiteCache',
+        'LOCATION': os.path.join(BASE_DIR, 'cache.sqlite3'),
+        'OPTIONS': {
+            'MAX_SIZE': 256 * 1024 * 1024,
+        },
+    }
+
 INTERNAL_IPS = [
     '127.0.0.1',
 ]
+
+# Токен для страницы метрик в заголовке X-Metrics-Token (кроме сотрудников);
+# без него страница доступна только сотрудникам
+METRICS_TOKEN = None
+
+# Авторы с таким числом подписчиков не раскладываются по лентам подписок,
+# их посты подмешиваются в ленту при чтении
+FEED_PULL_THRESHOLD = 10000
+
+# Курсорная пагинация списков постов вместо постраничной (без OFFSET и COUNT)
+POSTS_CURSOR_PAGINATION = False
+
+# Сколько секунд кешируется число постов в ленте подписок
+FEED_COUNT_TIMEOUT = 60
+
+# Время жизни закешированных страниц. Страницы сбрасываются при изменении
+# постов, групп, комментариев и подписок, поэтому TTL может быть большим
+PAGE_CACHE_TIMEOUT = 60 * 60 * 3
+
+# Сколько секунд устаревшая страница отдаётся, пока её перестраивают,
+# на сколько захватывается блокировка перестроения и сколько ждать
+# перестроения, если устаревшей копии нет
+PAGE_CACHE_STALE_TIMEOUT = 60
+PAGE_CACHE_LOCK_TIMEOUT = 30
+PAGE_CACHE_LOCK_WAIT = 2
+
+# Время жизни закешированных карточек постов в списках; карточки
+# сбрасываются при изменении поста, автора, группы и миниатюры
+CARD_CACHE_TIMEOUT = 60 * 60 * 24
+
+# Страницы для анонимных посетителей (см. core.anonymous_cache) живут
+# до сброса по тегам, но не дольше этого срока. Параметры запроса вне
+# ANONYMOUS_PAGE_CACHE_PARAMS не меняют ключ записи
+ANONYMOUS_PAGE_CACHE_TIMEOUT = 60 * 60
+ANONYMOUS_PAGE_CACHE_PARAMS = ('page', 'cursor', 'order')
+
+# Сброс страниц во внешнем кеширующем прокси (см. core.surrogate): ключи
+# копятся SURROGATE_PURGE_DELAY секунд и уходят POST-запросами на
+# SURROGATE_PURGE_URL с заголовками SURROGATE_PURGE_HEADERS (например,
+# токеном прокси). Без адреса сброс выключен
+SURROGATE_PURGE_URL = None
+SURROGATE_PURGE_HEADERS = {}
+SURROGATE_PURGE_DELAY = 1
+SURROGATE_PURGE_BATCH = 256
+SURROGATE_PURGE_TIMEOUT = 5
+
+# Объекты, которые ищутся почти на каждом запросе, кешируются в памяти
+# процесса и в общем кеше (см. core.object_cache): timeout — срок в общем
+# кеше, local_timeout — в памяти процесса, он же наибольшая задержка, с
+# которой другие процессы видят изменение объекта
+OBJECT_CACHE = {
+    'posts.group': {'timeout': 60 * 60, 'local_timeout': 30},
+    'auth.user': {
+        'timeout': 60 * 10,
+        'local_timeout': 5,
+        'ignore_updates': ['last_login'],
+        # Страницам нужны только имена; пароль и почта в кеш не попадают
+        'fields': ['username', 'first_name', 'last_name'],
+    },
+}
+OBJECT_CACHE_LOCAL_SIZE = 512
+
+# Сколько потоков строят миниатюры картинок постов; 0 — строить сразу
+# в запросе. Запрос не ждёт пул, поэтому в разработке и тестах пула нет:
+# иначе миниатюры писались бы в MEDIA_ROOT уже после ответа, когда тест
+# удаляет свой временный каталог
+THUMBNAIL_WORKERS = 0 if DEBUG else 2
+
+# PRAGMA боевого режима для соединений SQLite: журнал WAL и
+# synchronous=NORMAL, отображение файла в память (байты), кеш страниц
+# (отрицательное значение — в килобайтах) и ожидание блокировки (мс).
+# Их сравнивает с настройками по умолчанию команда bench_sqlite
+SQLITE_PRODUCTION_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'mmap_size': 256 * 1024 * 1024,
+    'cache_size': -64 * 1024,
+    'busy_timeout': 5000,
+}
+# PRAGMA, которые выполняются при открытии соединения SQLite. В
+# разработке и тестах SQLite работает с настройками по умолчанию
+SQLITE_PRAGMAS = {} if DEBUG else SQLITE_PRODUCTION_PRAGMAS
+
+# Реплики, из которых читают списки и страницы постов. Локально: добавьте
+# 'replica' и запустите python manage.py replicate_db --interval 1
+DATABASE_REPLICAS = []
+
+# Сколько секунд после записи пользователь читает только основную базу;
+# должно быть не меньше отставания реплик
+REPLICA_PIN_TIMEOUT = 10
+
+# Строки JSON с метриками каждого запроса (core.metrics) пишутся в консоль,
+# когда отладка выключена; превышения бюджетов запросов — всегда
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'message': {'format': '%(message)s'},
+    },
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+            'formatter': 'message',
+        },
+    },
+    'loggers': {
+        'core.metrics': {
+            'handlers': ['console'],
+            'level': 'WARNING' if DEBUG else 'INFO',
+            'propagate': False,
+        },
+        'core.query_budget': {
+            'handlers': ['console'],
+            'level': 'WARNING',
+            'propagate': False,
+        },
+    },
+}
+
+# Что делать, когда представление превышает бюджет запросов
+# (core.query_budget): 'raise' — ошибка, 'log' — предупреждение в лог,
+# 'off' — не проверять. Тестовый раннер включает 'raise'. Время базы по
+# умолчанию, мс
+QUERY_BUDGET_MODE = 'log'
+QUERY_BUDGET_DB_MS = 250
+
+TEST_RUNNER = 'core.test_runner.TestRunner'